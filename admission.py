@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Busy(Exception):
+    """Raised when a gate has no free slot and its queue is full (or waiting timed out)."""
+
+
+class RateLimiter:
+    """
+    Per-session token buckets.
+
+    Each session may make `rate` requests per second on average, with bursts of up
+    to `burst`. Buckets of the last max_sessions sessions are kept; an evicted
+    session simply starts again with a full bucket.
+    """
+
+    def __init__(self, rate: float, burst: float, max_sessions: int = 1024):
+        self.rate = rate
+        self.burst = burst
+        self.max_sessions = max_sessions
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def acquire(self, session_id: str) -> float:
+        """Take a token; returns 0 if one was available, else the seconds until there is one."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(session_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self.buckets[session_id] = (tokens, now)
+        while len(self.buckets) > self.max_sessions:
+            self.buckets.popitem(last=False)
+        return wait
+
+    async def wait(self, session_id: str):
+        """Wait until the session may proceed (for streams, where backpressure beats rejecting)."""
+        delay = self.acquire(session_id)
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.acquire(session_id)
+
+    def discard(self, session_id: str):
+        self.buckets.pop(session_id, None)
+
+
+class AdmissionGate:
+    """
+    Global limit on concurrent work of one kind, with a bounded queue in front.
+
+    At most `concurrency` holders run at once and at most `max_queue` wait for a
+    slot, each for up to queue_timeout seconds. Anything beyond that is refused
+    straight away with Busy, so an overloaded worker answers "busy" quickly
+    instead of letting requests pile up behind Ollama and the TTS pool.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, queue_timeout: float = 10.0):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # Queue depth and in-flight count, exported as gauges (see metrics.track_queue)
+        self.waiting = 0
+        self.running = 0
+
+    @asynccontextmanager
+    async def admit(self, wait: bool = True):
+        """Hold a slot for the duration of the block; raises Busy if none can be had."""
+        if self.semaphore.locked() and (not wait or self.waiting >= self.max_queue):
+            raise Busy(f"{self.name} is at capacity")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise Busy(f"Timed out waiting for {self.name}") from None
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+
+
+class Turn:
+    """
+    The output of one /talk turn, recorded so a retried request can replay it.
+
+    The turn runs as its own task and appends its (sentence, audio) chunks here;
+    any number of requests can replay them, from the start, while it is running
+    or after it finished.
+    """
+
+    def __init__(self, fingerprint: Optional[str]):
+        self.fingerprint = fingerprint
+        self.chunks: List[Tuple[str, bytes]] = []
+        self.error: Optional[BaseException] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    async def _produce(self, chunks: AsyncIterator[Tuple[str, bytes]]):
+        try:
+            async for chunk in chunks:
+                self.chunks.append(chunk)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished_at = time.monotonic()
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def started(self):
+        """Wait for the first chunk, or for the turn to end without one."""
+        while not self.chunks and not self.done:
+            await self._changed.wait()
+
+    async def replay(self) -> AsyncIterator[Tuple[str, bytes]]:
+        """Yield the turn's chunks as they are produced; re-raises the turn's error at the end."""
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class TurnDeduplicator:
+    """
+    Collapses retried /talk requests onto the turn they repeat.
+
+    The last turn of each session is remembered by fingerprint (a hash of the
+    request's answer, or the client's idempotency key). A request with the same
+    fingerprint while that turn is running, or within `window` seconds after it
+    finished, replays its output instead of generating (and saving) a second reply.
+    Turns that fail are forgotten, so the retry of a failed turn runs again.
+    """
+
+    def __init__(self, window: float = 10.0, max_sessions: int = 1024):
+        self.window = window
+        self.max_sessions = max_sessions
+        self.turns: "OrderedDict[str, Turn]" = OrderedDict()
+        # Keeps turns whose requests went away alive until they finish
+        self.running = set()
+
+    @staticmethod
+    def fingerprint(*parts: Any) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part if isinstance(part, bytes) else repr(part).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, session_id: str, fingerprint: Optional[str]) -> Optional[Turn]:
+        """Return the session's turn with this fingerprint if a request may still share it."""
+        turn = self.turns.get(session_id)
+        if fingerprint is None or turn is None or turn.fingerprint != fingerprint or turn.error is not None:
+            return None
+        if turn.done and time.monotonic() - turn.finished_at > self.window:
+            return None
+        return turn
+
+    def run(self, session_id: str, fingerprint: Optional[str], produce: Callable[[], AsyncIterator[Tuple[str, bytes]]]) -> Tuple[Turn, bool]:
+        """
+        Return (turn, whether it is a duplicate) for a request.
+
+        A new turn starts produce() in the background; it keeps running even if
+        the request that started it disconnects. A fingerprint of None (a request
+        that can't be identified) always starts a new turn.
+        """
+        turn = self.get(session_id, fingerprint)
+        if turn is not None:
+            self.turns.move_to_end(session_id)
+            return turn, True
+
+        turn = Turn(fingerprint)
+        turn.task = asyncio.create_task(turn._produce(produce()))
+        self.running.add(turn.task)
+        turn.task.add_done_callback(self.running.discard)
+        self.turns[session_id] = turn
+        self.turns.move_to_end(session_id)
+        while len(self.turns) > self.max_sessions:
+            self.turns.popitem(last=False)
+        return turn, False
+
+    def discard(self, session_id: str):
+        self.turns.pop(session_id, None)
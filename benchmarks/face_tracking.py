@@ -0,0 +1,123 @@
+"""
+Compare FaceDetector's full-scan path with tracking mode on recorded frames.
+
+For every input (a video file or a directory of images) both modes process the
+same frames in order; the script reports per-frame latency and how often the
+tracking results agree with the full scan.
+
+Usage:
+    python benchmarks/face_tracking.py interview.webm frames_dir/ \\
+        --working-width 320 --full-scan-interval 10 --eye-check-interval 5
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from face_detector import FaceDetector  # noqa: E402
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def iter_frames(path: str, max_frames: int) -> Iterator[np.ndarray]:
+    """Yield BGR frames from a video file or a directory of images, in order."""
+    if os.path.isdir(path):
+        names = sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names[:max_frames]:
+            frame = cv2.imread(os.path.join(path, name), cv2.IMREAD_COLOR)
+            if frame is not None:
+                yield frame
+        return
+
+    capture = cv2.VideoCapture(path)
+    try:
+        count = 0
+        while count < max_frames:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            count += 1
+            yield frame
+    finally:
+        capture.release()
+
+
+def run(detector: FaceDetector, frames: List[np.ndarray]) -> Dict[str, Any]:
+    latencies, results = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        results.append(detector.process_frame(frame))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"latencies": np.array(latencies), "results": results}
+
+
+def agreement(baseline: List[Dict[str, Any]], candidate: List[Dict[str, Any]], field: str) -> float:
+    matches = sum(1 for a, b in zip(baseline, candidate) if a[field] == b[field])
+    return 100.0 * matches / max(1, len(baseline))
+
+
+def eyes_warning(result: Dict[str, Any]) -> bool:
+    return "Face detected but no eyes visible" in result["warnings"]
+
+
+def report(name: str, frames: int, full: Dict[str, Any], tracked: Dict[str, Any]):
+    print(f"\n{name} ({frames} frames)")
+    print(f"  {'mode':<10} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for mode, data in (("full", full), ("tracking", tracked)):
+        lat = data["latencies"]
+        print(f"  {mode:<10} {lat.mean():9.2f} {np.percentile(lat, 50):9.2f} {np.percentile(lat, 95):9.2f} {lat.max():9.2f}")
+    speedup = full["latencies"].mean() / max(tracked["latencies"].mean(), 1e-9)
+    print(f"  speedup: {speedup:.2f}x")
+    print(f"  agreement: faces_count {agreement(full['results'], tracked['results'], 'faces_count'):.1f}%, "
+          f"tilt_detected {agreement(full['results'], tracked['results'], 'tilt_detected'):.1f}%, "
+          f"no-eyes warning {100.0 * sum(eyes_warning(a) == eyes_warning(b) for a, b in zip(full['results'], tracked['results'])) / max(1, frames):.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="video files or directories of frame images")
+    parser.add_argument("--max-frames", type=int, default=600)
+    parser.add_argument("--working-width", type=int, default=320)
+    parser.add_argument("--roi-padding", type=float, default=0.5)
+    parser.add_argument("--full-scan-interval", type=int, default=10)
+    parser.add_argument("--eye-check-interval", type=int, default=5)
+    args = parser.parse_args()
+
+    params = {"min_detection_confidence": 0.5, "movement_threshold": 0.1, "history_size": 10}
+    all_full, all_tracked = [], []
+    for path in args.inputs:
+        frames = list(iter_frames(path, args.max_frames))
+        if not frames:
+            print(f"\n{path}: no frames could be read, skipping")
+            continue
+
+        full = run(FaceDetector(**params), frames)
+        tracked = run(FaceDetector(
+            **params,
+            tracking=True,
+            working_width=args.working_width,
+            roi_padding=args.roi_padding,
+            full_scan_interval=args.full_scan_interval,
+            eye_check_interval=args.eye_check_interval,
+        ), frames)
+        report(path, len(frames), full, tracked)
+        all_full.append(full)
+        all_tracked.append(tracked)
+
+    if len(all_full) > 1:
+        merge = lambda runs: {
+            "latencies": np.concatenate([r["latencies"] for r in runs]),
+            "results": [result for r in runs for result in r["results"]],
+        }
+        full, tracked = merge(all_full), merge(all_tracked)
+        report("all inputs", len(full["results"]), full, tracked)
+
+
+if __name__ == "__main__":
+    main()
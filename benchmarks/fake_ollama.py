@@ -0,0 +1,73 @@
+"""
+Local stand-in for the Ollama /api/chat endpoint, for benchmarks.
+
+Replies with a fixed interview question, streamed token by token with a
+configurable time to first token and per-token latency, so LLM latency is
+reproducible and the app's own overhead can be measured.
+
+Usage:
+    python benchmarks/fake_ollama.py --port 11434 --first-token-ms 200 --token-ms 20
+"""
+import argparse
+import asyncio
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLY = (
+    "Thanks, that helps. Can you explain how React decides when to re-render a component, "
+    "and how you would avoid unnecessary renders in a large list?"
+)
+
+
+def create_app(first_token_ms: float = 200, token_ms: float = 20, reply: str = REPLY) -> FastAPI:
+    app = FastAPI()
+    tokens = [word + " " for word in reply.split()]
+
+    def final_chunk(prompt_chars: int):
+        return {
+            "done": True,
+            "prompt_eval_count": prompt_chars // 4,
+            "eval_count": len(tokens),
+            "prompt_eval_duration": int(first_token_ms * 1e6),
+            "eval_duration": int(token_ms * len(tokens) * 1e6),
+        }
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        payload = await request.json()
+        model = payload.get("model", "fake")
+        prompt_chars = sum(len(message.get("content", "")) for message in payload.get("messages", []))
+
+        if not payload.get("stream", True):
+            await asyncio.sleep((first_token_ms + token_ms * len(tokens)) / 1000)
+            return JSONResponse({
+                "model": model,
+                "message": {"role": "assistant", "content": reply},
+                **final_chunk(prompt_chars),
+            })
+
+        async def lines():
+            await asyncio.sleep(first_token_ms / 1000)
+            for token in tokens:
+                yield json.dumps({"model": model, "message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+                await asyncio.sleep(token_ms / 1000)
+            yield json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, **final_chunk(prompt_chars)}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--token-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.first_token_ms, args.token_ms), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,381 @@
+"""
+Concurrent load test for the interview API.
+
+Every simulated session calls /start-session and then, for --duration seconds,
+runs three loops side by side like the frontend does: interview turns on /talk
+(uploading the recorded answer), webcam frames on /process-face at --face-fps,
+and keystrokes on /track-keyboard at --keys-per-second.
+
+By default the app is started in this process against local stand-ins: the fake
+Ollama server from fake_ollama.py (with configurable token latency) and
+fakeredis (or a real Redis with --redis-url). --stub-speech also replaces ffmpeg
+decoding, speech recognition and TTS with fixed-latency fakes for machines
+without ffmpeg/espeak or network access. Pass --url to load an already running
+server instead.
+
+The report lists throughput and p50/p95/p99 latency per endpoint (measured by
+the client) and per pipeline stage (from the server's /metrics histograms).
+Save a run with --save and compare later runs to it with --baseline.
+
+Usage:
+    python benchmarks/load_test.py --sessions 20 --duration 60 --frames interview.webm
+    python benchmarks/load_test.py --sessions 20 --save baseline.json
+    python benchmarks/load_test.py --sessions 20 --baseline baseline.json
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --sessions 50
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import httpx
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from face_tracking import iter_frames  # noqa: E402
+from fake_ollama import create_app  # noqa: E402
+
+KEYS = list("abcdefghijklmnopqrstuvwxyz") + ["Shift", "Backspace", "Enter", " "]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_in_thread(app, port: int):
+    """Run an ASGI app with uvicorn on its own thread and event loop; returns the server and its thread."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"server on port {port} failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def stub_speech(main, stt_ms: float, tts_ms: float):
+    """Replace ffmpeg decoding, STT and TTS with fixed-latency fakes (in-process mode only)."""
+    import speech
+    from metrics import track_queue
+    from pipeline import thread_stage
+    from stt import SpeechRecognizer
+
+    class StubRecognizer(SpeechRecognizer):
+        name = "stub"
+
+        def transcribe(self, pcm, sample_rate):
+            time.sleep(stt_ms / 1000)
+            return "I would use React memo and keep list items keyed by a stable id"
+
+    def text_to_speech(text):
+        time.sleep(tts_ms / 1000)
+        return text.encode() * 40
+
+    speech.decode_to_pcm = lambda data, sample_rate=speech.SAMPLE_RATE: bytes(len(data))
+    speech.text_to_speech = text_to_speech
+    main.recognizer = StubRecognizer()
+    # The fake TTS has to run in this process, so swap the TTS process pool for threads
+    main.tts_stage.shutdown()
+    main.tts_stage = thread_stage("tts", main.tts_stage.concurrency)
+    track_queue("tts", lambda: main.tts_stage.waiting, lambda: main.tts_stage.running)
+
+
+def start_local_app(args) -> Tuple[str, List[Tuple[Any, threading.Thread]]]:
+    """
+    Start fake Ollama (--ollama-backends instances) and the app in this process.
+
+    Returns the app's base URL and the servers to pass to stop_local_app.
+    """
+    servers, urls = [], []
+    for _ in range(args.ollama_backends):
+        ollama_port = free_port()
+        servers.append(serve_in_thread(create_app(args.first_token_ms, args.token_ms), ollama_port))
+        urls.append(f"http://127.0.0.1:{ollama_port}")
+    os.environ["OLLAMA_URLS"] = ",".join(urls)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    import main
+
+    if args.redis_url:
+        import redis.asyncio
+        client = redis.asyncio.Redis.from_url(args.redis_url, decode_responses=True)
+    else:
+        import fakeredis
+        client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    main.redis_client = client
+    for store in (main.history_store, main.keyboard_states, main.face_states):
+        store.client = client
+
+    if args.stub_speech:
+        stub_speech(main, args.stt_ms, args.tts_ms)
+
+    app_port = free_port()
+    # The app stops first, while the fake Ollama servers are still up
+    servers.insert(0, serve_in_thread(main.app, app_port))
+    return f"http://127.0.0.1:{app_port}", servers
+
+
+def stop_local_app(servers: List[Tuple[Any, threading.Thread]]):
+    """Stop the servers started by start_local_app and wait for the app's worker processes to exit."""
+    import main
+
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join()
+    # The app's shutdown doesn't wait for its pools; wait here so no worker outlives the run
+    main.stt_stage.shutdown(wait=True)
+    main.tts_stage.shutdown(wait=True)
+    if main.face_engine:
+        main.face_engine.shutdown(wait=True)
+
+
+def load_frames(path: Optional[str], max_frames: int) -> List[str]:
+    """Base64 JPEG frames from a video or image directory (synthetic noise frames without one)."""
+    if path:
+        frames = list(iter_frames(path, max_frames))
+    else:
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(10)]
+    encoded = []
+    for frame in frames:
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        if ok:
+            encoded.append(base64.b64encode(jpeg.tobytes()).decode())
+    if not encoded:
+        raise SystemExit(f"{path}: no frames could be read")
+    return encoded
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, endpoint: str, send) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await send()
+        except httpx.HTTPError:
+            self.errors[endpoint] += 1
+            return None
+        self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+        return response
+
+
+async def run_session(client: httpx.AsyncClient, recorder: Recorder, args, audio: bytes, frames: List[str], deadline: float):
+    response = await recorder.request("/start-session", lambda: client.get("/start-session"))
+    if response is None or response.status_code >= 400:
+        return
+    session_id = response.json()["session_id"]
+    params = {"session_id": session_id}
+
+    async def talk():
+        turn = 0
+        while time.monotonic() < deadline:
+            timed_out = args.timeout_every and turn % args.timeout_every == args.timeout_every - 1
+            files = None if timed_out else {"file": ("answer.webm", audio, "audio/webm")}
+            data = {"isTimeCompleted": "true" if timed_out else "false"}
+            # Every turn uploads the same recording; the key keeps the server from treating it as a retry
+            headers = {"Idempotency-Key": f"{session_id}:{turn}"}
+            await recorder.request("/talk", lambda: client.post(
+                "/talk", params={**params, "stream": str(args.stream).lower()}, data=data, files=files, headers=headers
+            ))
+            turn += 1
+            await asyncio.sleep(args.think_time)
+
+    async def face():
+        interval = 1 / args.face_fps
+        for frame in itertools.cycle(frames):
+            if time.monotonic() >= deadline:
+                break
+            start = time.monotonic()
+            await recorder.request("/process-face", lambda: client.post("/process-face", params=params, json={"image": frame}))
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - start)))
+
+    async def keyboard():
+        interval = 1 / args.keys_per_second
+        while time.monotonic() < deadline:
+            event = {"event_type": "keydown", "key": random.choice(KEYS), "timestamp": int(time.time() * 1000)}
+            await recorder.request("/track-keyboard", lambda: client.post("/track-keyboard", params=params, json=event))
+            await asyncio.sleep(interval)
+
+    loops = [talk()]
+    if args.face_fps > 0:
+        loops.append(face())
+    if args.keys_per_second > 0:
+        loops.append(keyboard())
+    await asyncio.gather(*loops)
+
+
+def stage_buckets(metrics_text: str) -> Dict[Tuple[str, str], Dict[float, float]]:
+    """Cumulative bucket counts of hrbot_stage_duration_seconds per (endpoint, stage)."""
+    buckets: Dict[Tuple[str, str], Dict[float, float]] = defaultdict(dict)
+    for family in text_string_to_metric_families(metrics_text):
+        if family.name != "hrbot_stage_duration_seconds":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_bucket"):
+                key = (sample.labels["endpoint"], sample.labels["stage"])
+                buckets[key][float(sample.labels["le"])] = sample.value
+    return buckets
+
+
+def histogram_quantile(q: float, buckets: Dict[float, float]) -> float:
+    """Estimate a quantile from cumulative buckets, interpolating linearly inside a bucket."""
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]]
+    rank = q * total
+    lower, below = 0.0, 0.0
+    for bound in bounds:
+        if buckets[bound] >= rank:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * (rank - below) / max(buckets[bound] - below, 1e-9)
+        lower, below = bound, buckets[bound]
+    return lower
+
+
+def summarize(recorder: Recorder, before: str, after: str, elapsed: float) -> Dict[str, Any]:
+    endpoints = {}
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        values = np.array(latencies)
+        endpoints[endpoint] = {
+            "requests": len(values),
+            "errors": recorder.errors.get(endpoint, 0),
+            "rps": len(values) / elapsed,
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+            "p99": float(np.percentile(values, 99)),
+        }
+
+    stages = {}
+    start = stage_buckets(before)
+    for key, counts in sorted(stage_buckets(after).items()):
+        delta = {bound: value - start.get(key, {}).get(bound, 0.0) for bound, value in counts.items()}
+        observations = delta[float("inf")]
+        if observations <= 0:
+            continue
+        stages[f"{key[0]}/{key[1]}"] = {
+            "requests": int(observations),
+            "rps": observations / elapsed,
+            **{f"p{int(q * 100)}": histogram_quantile(q, delta) * 1000 for q in (0.5, 0.95, 0.99)},
+        }
+    return {"elapsed": elapsed, "endpoints": endpoints, "stages": stages}
+
+
+def print_table(title: str, rows: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]]):
+    print(f"\n{title}")
+    print(f"  {'name':<28} {'count':>7} {'err':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}" + ("   p95 vs baseline" if baseline else ""))
+    for name, row in rows.items():
+        line = (f"  {name:<28} {row['requests']:7d} {row.get('errors', 0):5d} {row['rps']:8.2f} "
+                f"{row['p50']:9.1f} {row['p95']:9.1f} {row['p99']:9.1f}")
+        if baseline and name in baseline:
+            change = 100.0 * (row["p95"] - baseline[name]["p95"]) / max(baseline[name]["p95"], 1e-9)
+            line += f"   {change:+7.1f}%"
+        print(line)
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float):
+    """Wait for the app's warm-up to finish so cold start isn't part of the measurements."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise SystemExit(f"server not ready after {timeout:.0f}s (see GET /ready)")
+
+
+async def run(args, base_url: str) -> Dict[str, Any]:
+    with open(args.audio, "rb") as f:
+        audio = f.read()
+    frames = load_frames(args.frames, args.max_frames)
+
+    limits = httpx.Limits(max_connections=args.sessions * 3, max_keepalive_connections=args.sessions * 3)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        await wait_until_ready(client, args.ready_timeout)
+        before = (await client.get("/metrics")).text
+        recorder = Recorder()
+        start = time.monotonic()
+        deadline = start + args.duration
+        sessions = []
+        for _ in range(args.sessions):
+            sessions.append(asyncio.create_task(run_session(client, recorder, args, audio, frames, deadline)))
+            await asyncio.sleep(args.ramp_up / max(1, args.sessions))
+        await asyncio.gather(*sessions)
+        elapsed = time.monotonic() - start
+        after = (await client.get("/metrics")).text
+    return summarize(recorder, before, after, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="load a running server instead of starting the app in this process")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent interview sessions")
+    parser.add_argument("--duration", type=float, default=30, help="seconds each session keeps sending traffic")
+    parser.add_argument("--ramp-up", type=float, default=2, help="seconds over which sessions are started")
+    parser.add_argument("--think-time", type=float, default=1.0, help="pause between a session's /talk turns")
+    parser.add_argument("--timeout-every", type=int, default=4, help="every Nth turn is a timed-out answer (0: never)")
+    parser.add_argument("--stream", action="store_true", help="use the streaming /talk response")
+    parser.add_argument("--face-fps", type=float, default=2, help="webcam frames per second per session (0: off)")
+    parser.add_argument("--keys-per-second", type=float, default=3, help="keystrokes per second per session (0: off)")
+    parser.add_argument("--audio", default=os.path.join(ROOT, "audio.webm"), help="recorded answer uploaded to /talk")
+    parser.add_argument("--frames", help="video file or directory of frame images sent to /process-face")
+    parser.add_argument("--max-frames", type=int, default=100)
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--ready-timeout", type=float, default=120, help="how long to wait for GET /ready")
+    parser.add_argument("--first-token-ms", type=float, default=200, help="fake Ollama time to first token")
+    parser.add_argument("--token-ms", type=float, default=20, help="fake Ollama per-token latency")
+    parser.add_argument("--ollama-backends", type=int, default=1, help="fake Ollama instances the app routes between")
+    parser.add_argument("--redis-url", help="use this Redis instead of fakeredis (in-process mode)")
+    parser.add_argument("--stub-speech", action="store_true", help="fake ffmpeg, STT and TTS (in-process mode)")
+    parser.add_argument("--stt-ms", type=float, default=300, help="stub STT latency")
+    parser.add_argument("--tts-ms", type=float, default=150, help="stub TTS latency")
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare p95 latencies with results saved by --save")
+    args = parser.parse_args()
+
+    base_url, servers = (args.url, []) if args.url else start_local_app(args)
+    try:
+        results = asyncio.run(run(args, base_url))
+    finally:
+        if servers:
+            stop_local_app(servers)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(f"{args.sessions} sessions for {results['elapsed']:.1f}s against {base_url}")
+    print_table("Endpoints (client-side)", results["endpoints"], baseline and baseline["endpoints"])
+    print_table("Stages (server histograms)", results["stages"], baseline and baseline["stages"])
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
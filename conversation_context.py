@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import httpx
+import redis.asyncio as redis
+
+from history_store import ChatHistoryStore
+from llm_client import OllamaClient
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Summarize the interview below in under 120 words for the interviewer's notes: "
+    "which topics were asked, how the candidate answered each, and any strengths or gaps. "
+    "Merge it with the previous summary if one is given. Reply with the summary only."
+)
+
+
+class ConversationContext:
+    """
+    Keeps the LLM prompt bounded as an interview gets longer.
+
+    The prompt is the session's system prompt, a rolling summary of older turns,
+    and the turns since that summary verbatim. Verbatim turns accumulate until
+    there are keep_turns + summarize_every of them; the oldest ones are then
+    folded into the summary in the background, leaving keep_turns.
+
+    Between refreshes each prompt is the previous prompt plus the new turn, so
+    Ollama can reuse the KV cache for the unchanged prefix.
+    """
+
+    def __init__(self, store: ChatHistoryStore, llm: OllamaClient, keep_turns: int = 6, summarize_every: int = 4):
+        self.store = store
+        self.llm = llm
+        self.keep_messages = 2 * keep_turns
+        self.max_messages = 2 * (keep_turns + summarize_every)
+        self.refreshing: Dict[str, asyncio.Task] = {}
+
+    async def build(self, session_id: str, default_system: Dict[str, str], new_messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Build the chat messages for the next turn.
+
+        Returns {"messages": [...], "history_length": n, "summarized": covered}.
+        """
+        first, tail, length, summary = await self.store.load_window(session_id, self.max_messages)
+        covered = int(summary.get("covered", 0))
+
+        # A history that lost its system prompt still gets the default one
+        has_system = bool(first) and first.get("role") == "system"
+        messages = [first if has_system else default_system]
+        if summary.get("text"):
+            messages.append({"role": "system", "content": f"Summary of the interview so far: {summary['text']}"})
+
+        # tail holds messages [length - len(tail), length); skip the system prompt
+        # and anything the summary already covers
+        skip = 1 if has_system else 0
+        tail_start = length - len(tail)
+        verbatim_start = max(skip + covered, skip, tail_start)
+        messages.extend(tail[verbatim_start - tail_start:])
+        messages.extend(new_messages)
+
+        return {"messages": messages, "history_length": length, "summarized": covered}
+
+    def needs_summary(self, history_length: int, covered: int) -> bool:
+        return history_length - 1 - covered >= self.max_messages
+
+    def schedule_refresh(self, session_id: str, history_length: int, covered: int):
+        """Start a background summary refresh if enough turns have accumulated."""
+        if session_id in self.refreshing or not self.needs_summary(history_length, covered):
+            return
+        self.refreshing[session_id] = asyncio.create_task(self._refresh(session_id))
+
+    async def _refresh(self, session_id: str):
+        try:
+            length, summary = await self.store.summary_state(session_id)
+            covered = int(summary.get("covered", 0))
+            new_covered = length - 1 - self.keep_messages
+            if new_covered <= covered:
+                return
+
+            to_fold = await self.store.load(session_id, 1 + covered, new_covered - covered)
+            transcript = "\n".join(f"{message['role'].capitalize()}: {message['content']}" for message in to_fold)
+            previous = summary.get("text")
+            content = f"Previous summary: {previous}\n\n{transcript}" if previous else transcript
+
+            response = await self.llm.chat([
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": content},
+            ])
+            if response.status_code != 200:
+                logger.error("Error summarizing session %s: status %s", session_id, response.status_code)
+                return
+            text = response.json().get("message", {}).get("content", "").strip()
+            if text:
+                await self.store.set_summary(session_id, text, new_covered)
+        except (httpx.HTTPError, ValueError, redis.RedisError):
+            # Runs as a background task: nothing would retrieve the exception otherwise
+            logger.exception("Error summarizing session %s", session_id)
+        finally:
+            self.refreshing.pop(session_id, None)
+
+    async def complete_turn(self, session_id: str, context: Dict[str, Any], stats: Optional[Dict[str, Any]]):
+        """
+        Call once the turn built from context has been saved.
+
+        Stores the turn's prompt size and token counts, so prompt cost can be
+        tracked as the interview grows, and refreshes the summary if it is due.
+        """
+        metrics = {
+            "turn": context["history_length"] // 2 + 1,
+            "history_messages": context["history_length"],
+            "summarized_messages": context["summarized"],
+            "prompt_messages": len(context["messages"]),
+            "prompt_chars": sum(len(message["content"]) for message in context["messages"]),
+        }
+        metrics.update(stats or {})
+        await self.store.append_metrics(session_id, metrics)
+        self.schedule_refresh(session_id, context["history_length"] + 2, context["summarized"])
@@ -1,66 +1,218 @@
 import cv2
 import numpy as np
-from typing import Dict, List, Any
+from functools import lru_cache
+from typing import Dict, List, Any, Optional
 import time
 
+
+@lru_cache(maxsize=None)
+def load_cascades():
+    """
+    Load the pre-trained Haar cascade classifiers for face and eye detection.
+
+    The XML files are included with the OpenCV installation. They are parsed once
+    per process and shared by every FaceDetector in it.
+    """
+    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+    return face_cascade, eye_cascade
+
+
+class FaceTrackingState:
+    """
+    Per-session head-movement state, kept apart from the (heavy) cascade models.
+
+    It is small and picklable, so it can travel with a frame to whichever worker
+    process handles it.
+
+    Every face being followed has a track slot: its last box (normalized x, y,
+    w, h) and a ring buffer with its last history_size positions (normalized
+    center x, center y and size). samples counts the positions written to a
+    slot (0 marks a free slot) and missed the frames since it was last matched.
+    """
+
+    def __init__(self, history_size: int = 10, max_tracks: int = 4):
+        self.boxes = np.zeros((max_tracks, 4))
+        self.positions = np.zeros((max_tracks, history_size, 3))
+        self.samples = np.zeros(max_tracks, dtype=np.int64)
+        self.missed = np.zeros(max_tracks, dtype=np.int64)
+        # None until the first warning, whatever clock the timestamps use
+        self.last_warning_time: Optional[float] = None
+        
+        # Tracking mode: last face box (normalized x, y, w, h) and scan/eye cadence
+        self.last_face_box = None
+        self.frames_since_full_scan = 0
+        self.frame_index = 0
+        self.eyes_missing = []
+    
+    @property
+    def history_size(self) -> int:
+        return self.positions.shape[1]
+    
+    @property
+    def max_tracks(self) -> int:
+        return self.positions.shape[0]
+    
+    def history(self, track: int) -> np.ndarray:
+        """Positions of a track, oldest first."""
+        count = min(int(self.samples[track]), self.history_size)
+        return self.positions[track, (self.samples[track] - count + np.arange(count)) % self.history_size]
+    
+    def _set_track(self, track: int, box, positions, missed: int):
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)[-self.history_size:]
+        self.boxes[track] = box
+        self.positions[track, :len(positions)] = positions
+        self.samples[track] = len(positions)
+        self.missed[track] = missed
+    
+    def resize(self, history_size: int, max_tracks: int):
+        """Change the buffer sizes, keeping the most recent positions of each track."""
+        if (history_size, max_tracks) == (self.history_size, self.max_tracks):
+            return
+        tracks = [(self.boxes[t].copy(), self.history(t), int(self.missed[t])) for t in np.flatnonzero(self.samples)]
+        self.boxes = np.zeros((max_tracks, 4))
+        self.positions = np.zeros((max_tracks, history_size, 3))
+        self.samples = np.zeros(max_tracks, dtype=np.int64)
+        self.missed = np.zeros(max_tracks, dtype=np.int64)
+        for track, (box, positions, missed) in enumerate(tracks[:max_tracks]):
+            self._set_track(track, box, positions, missed)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the state as a JSON-serializable dict."""
+        return {
+            "history_size": self.history_size,
+            "max_tracks": self.max_tracks,
+            "tracks": [
+                {"box": self.boxes[t].tolist(), "positions": self.history(t).tolist(), "missed": int(self.missed[t])}
+                for t in np.flatnonzero(self.samples)
+            ],
+            "last_warning_time": self.last_warning_time,
+            "last_face_box": list(self.last_face_box) if self.last_face_box is not None else None,
+            "frames_since_full_scan": self.frames_since_full_scan,
+            "frame_index": self.frame_index,
+            "eyes_missing": [bool(missing) for missing in self.eyes_missing],
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "FaceTrackingState":
+        """Rebuild a state from to_dict() output (a fresh state for None)."""
+        if not data:
+            return cls()
+        state = cls(data.get("history_size", 10), data.get("max_tracks", 4))
+        for track, saved in enumerate(data.get("tracks", [])[:state.max_tracks]):
+            state._set_track(track, saved["box"], saved["positions"], saved.get("missed", 0))
+        state.last_warning_time = data.get("last_warning_time")
+        state.last_face_box = tuple(data["last_face_box"]) if data.get("last_face_box") else None
+        state.frames_since_full_scan = data.get("frames_since_full_scan", 0)
+        state.frame_index = data.get("frame_index", 0)
+        state.eyes_missing = list(data.get("eyes_missing", []))
+        return state
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of (x, y, w, h) boxes: a is (n, 4), b is (m, 4), the result (n, m)."""
+    x0 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y0 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x1 = np.minimum(a[:, None, 0] + a[:, None, 2], b[None, :, 0] + b[None, :, 2])
+    y1 = np.minimum(a[:, None, 1] + a[:, None, 3], b[None, :, 1] + b[None, :, 3])
+    intersection = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+    union = (a[:, None, 2] * a[:, None, 3]) + (b[None, :, 2] * b[None, :, 3]) - intersection
+    return intersection / np.maximum(union, 1e-12)
+
+
 class FaceDetector:
     def __init__(
         self, 
         min_detection_confidence=0.5, 
         movement_threshold=0.15,  # Increased threshold to be less sensitive
         history_size=10,
-        tilt_threshold=0.06  # New parameter specifically for tilt detection
+        tilt_threshold=0.06,  # New parameter specifically for tilt detection
+        tracking=False,
+        working_width=None,
+        roi_padding=0.5,
+        full_scan_interval=10,
+        eye_check_interval=5,
+        smoothing_window=2,
+        max_faces=4
     ):
-        # Load the pre-trained Haar cascade classifiers for face detection
-        # These XML files are included with OpenCV installation
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+        self.face_cascade, self.eye_cascade = load_cascades()
         
-        # Parameters for head movement detection
-        self.prev_face_positions = []
+        # Tracking mode: frames are downscaled to working_width pixels wide and,
+        # while a single face is being followed, only a region padded by
+        # roi_padding (fraction of the face size) around its last position is
+        # searched. A full-frame scan runs every full_scan_interval frames or when
+        # the face is lost; eyes are validated every eye_check_interval frames.
+        self.tracking = tracking
+        self.working_width = working_width
+        self.roi_padding = roi_padding
+        self.full_scan_interval = full_scan_interval
+        self.eye_check_interval = eye_check_interval if tracking else 1
+        
+        # Parameters for head movement detection. Up to max_faces faces are tracked
+        # over their last history_size frames; tilt and movement compare the mean of
+        # the last smoothing_window positions with the mean of the ones before, so a
+        # single jittery detection can't raise a warning on its own. The price is
+        # latency: a turn is only reported once it has been held for about
+        # smoothing_window frames (e.g. 2 s at 1 fps with the default of 2), and a
+        # shorter glance not at all. Use 1 when frames are seconds apart.
         self.movement_threshold = movement_threshold
         self.tilt_threshold = tilt_threshold
-        self.history_size = history_size
-        self.last_warning_time = 0
+        self.history_size = max(history_size, smoothing_window + 1)
+        self.smoothing_window = smoothing_window
+        self.max_faces = max_faces
         self.warning_cooldown = 5  # Increased cooldown between warnings (5 seconds)
         
+        # Faces are matched to tracks when their boxes overlap by match_iou or their
+        # centers are within match_distance (fraction of the frame); tracks that go
+        # unmatched for more than max_missed_frames frames are dropped
+        self.match_iou = 0.1
+        self.match_distance = 0.2
+        self.max_missed_frames = 2
+        
+        # State used when process_frame is called without a session state
+        self.state = FaceTrackingState(self.history_size, self.max_faces)
+        
         # Convert min_detection_confidence to scaleFactor (inverse relationship)
         # Lower scale factor = higher confidence but slower detection
         self.scale_factor = 1.1 + (1 - min_detection_confidence) * 0.2
         self.min_neighbors = int(5 * min_detection_confidence)
     
-    def process_frame(self, frame) -> Dict[str, Any]:
+    def process_frame(self, frame, state: Optional[FaceTrackingState] = None, timings: Optional[Dict[str, float]] = None, timestamp: Optional[float] = None) -> Dict[str, Any]:
         """
         Process a frame to detect faces and head movements (specifically left/right tilts).
         
         Args:
             frame: The video frame to process
+            state: Tracking state of the session the frame belongs to; updated in place.
+                Defaults to this detector's own state.
+            timings: Optional dict that receives the cascade and eye pass durations in seconds.
+            timestamp: When the frame was captured, in seconds (defaults to now); the
+                warning cooldown is measured on this clock, e.g. a recording's timeline.
             
         Returns:
             Dict containing:
                 - faces_count: Number of faces detected
                 - tilt_detected: Whether significant head tilt was detected
                 - tilt_direction: Direction of tilt ("left", "right", or None)
+                - movement_detected: Whether a face moved more than movement_threshold
                 - warnings: List of warning messages
         """
+        if state is None:
+            state = self.state
+        
         if frame is None:
-            return {"faces_count": 0, "tilt_detected": False, "tilt_direction": None, "warnings": ["No frame received"]}
+            return {"faces_count": 0, "tilt_detected": False, "tilt_direction": None, "movement_detected": False, "warnings": ["No frame received"]}
         
         # Convert to grayscale for Haar cascade detection
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         
         warnings = []
         faces_count = 0
-        tilt_detected = False
-        tilt_direction = None
         
         # Detect faces in the image
-        faces = self.face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=self.scale_factor,
-            minNeighbors=self.min_neighbors,
-            minSize=(30, 30)
-        )
+        start = time.perf_counter()
+        faces = self._detect_faces(gray, state)
+        cascade_time = time.perf_counter() - start
         
         # Process face detection results
         if len(faces) > 0:
@@ -72,60 +224,189 @@ class FaceDetector:
         else:
             warnings.append("No face detected")
             
-        # Track face positions for tilt detection
-        current_positions = []
-        for (x, y, w, h) in faces:
-            # Use center of face as reference point for head position
-            center_x = x + w/2
-            center_y = y + h/2
-            face_size = w * h  # Used to normalize movement
-            
-            # Store position with normalized coordinates (0-1 range)
-            height, width = frame.shape[:2]
-            norm_x = center_x / width
-            norm_y = center_y / height
-            norm_size = face_size / (width * height)
-            
-            # Calculate face angle/orientation if possible 
-            # This is a simple approximation - using x-coordinate changes to detect tilt
-            current_positions.append((norm_x, norm_y, norm_size))
-            
-            # Validate face detection with eye detection for better accuracy
-            roi_gray = gray[y:y+h, x:x+w]
-            eyes = self.eye_cascade.detectMultiScale(roi_gray)
-            if len(eyes) == 0:
+        # Validate face detection with eye detection for better accuracy
+        # (in tracking mode the last result is reused between checks)
+        start = time.perf_counter()
+        if state.frame_index % self.eye_check_interval == 0 or len(state.eyes_missing) != len(faces):
+            state.eyes_missing = [self._eyes_missing(gray, face) for face in faces]
+        for missing in state.eyes_missing:
+            if missing:
                 # No eyes detected in the face region, might be a false positive
                 warnings.append("Face detected but no eyes visible")
+        state.frame_index += 1
+        if timings is not None:
+            timings["cascade"] = cascade_time
+            timings["eye_pass"] = time.perf_counter() - start
         
-        # Detect head tilt (left/right only)
-        if current_positions and self.prev_face_positions:
-            for i, current_pos in enumerate(current_positions):
-                if i < len(self.prev_face_positions):
-                    prev_pos = self.prev_face_positions[i]
-                    
-                    # Focus only on horizontal (x) movement for tilt detection
-                    # Ignore vertical (y) movements and size changes
-                    x_shift = current_pos[0] - prev_pos[0]
-                    
-                    # Only detect significant left/right movements
-                    if abs(x_shift) > self.tilt_threshold:
-                        tilt_detected = True
-                        tilt_direction = "left" if x_shift > 0 else "right"
-                        
-                        # Add cooldown between warnings to prevent spamming
-                        current_time = time.time()
-                        if current_time - self.last_warning_time > self.warning_cooldown:
-                            warnings.append(f"Head tilt detected ({tilt_direction})")
-                            self.last_warning_time = current_time
-        
-        # Update position history
-        self.prev_face_positions = current_positions
-        if len(self.prev_face_positions) > self.history_size:
-            self.prev_face_positions = self.prev_face_positions[-self.history_size:]
+        # Detect head tilt (left/right only) and movement on the faces' trajectories
+        height, width = frame.shape[:2]
+        boxes = np.asarray(faces, dtype=np.float64).reshape(-1, 4) / (width, height, width, height)
+        tilt_direction, movement_detected = self._track_faces(state, boxes)
+        tilt_detected = tilt_direction is not None
+        if tilt_detected:
+            # Add cooldown between warnings to prevent spamming
+            current_time = timestamp if timestamp is not None else time.time()
+            if state.last_warning_time is None or current_time - state.last_warning_time > self.warning_cooldown:
+                warnings.append(f"Head tilt detected ({tilt_direction})")
+                state.last_warning_time = current_time
         
         return {
             "faces_count": faces_count,
             "tilt_detected": tilt_detected,
             "tilt_direction": tilt_direction,
+            "movement_detected": movement_detected,
             "warnings": warnings
-        }
\ No newline at end of file
+        }
+    
+    def _track_faces(self, state: FaceTrackingState, boxes: np.ndarray):
+        """
+        Add this frame's faces (normalized x, y, w, h boxes) to their tracks.
+
+        Returns (tilt direction or None, whether any face moved significantly).
+        """
+        state.resize(self.history_size, self.max_faces)
+        matched = self._associate(state, boxes)
+        
+        # Matched faces extend their track; new faces take a free slot
+        tracks = np.flatnonzero(matched >= 0)
+        detections = matched[tracks]
+        free = np.flatnonzero(state.samples == 0)
+        new_faces = np.setdiff1d(np.arange(len(boxes)), detections)[:len(free)]
+        new_tracks = free[:len(new_faces)]
+        tracks = np.concatenate([tracks, new_tracks])
+        detections = np.concatenate([detections, new_faces])
+        
+        centers = boxes[detections, :2] + boxes[detections, 2:] / 2
+        sizes = boxes[detections, 2] * boxes[detections, 3]
+        state.positions[tracks, state.samples[tracks] % self.history_size] = np.column_stack([centers, sizes])
+        state.boxes[tracks] = boxes[detections]
+        state.samples[tracks] += 1
+        
+        # Tracks without a face this frame are kept for a few frames, then dropped
+        unmatched = np.setdiff1d(np.flatnonzero(state.samples), tracks)
+        state.missed[tracks] = 0
+        state.missed[unmatched] += 1
+        state.samples[unmatched[state.missed[unmatched] > self.max_missed_frames]] = 0
+        
+        return self._trajectory_shifts(state, tracks)
+    
+    def _associate(self, state: FaceTrackingState, boxes: np.ndarray) -> np.ndarray:
+        """Match tracks to detected faces; returns the face index per track slot (-1 if none)."""
+        matched = np.full(state.max_tracks, -1)
+        active = state.samples > 0
+        if not active.any() or len(boxes) == 0:
+            return matched
+        
+        iou = box_iou(state.boxes, boxes)
+        track_centers = state.boxes[:, :2] + state.boxes[:, 2:] / 2
+        face_centers = boxes[:, :2] + boxes[:, 2:] / 2
+        distance = np.linalg.norm(track_centers[:, None, :] - face_centers[None, :, :], axis=2)
+        
+        # Lower cost for closer, more overlapping pairs; impossible pairs cost inf
+        cost = np.where(
+            active[:, None] & ((iou >= self.match_iou) | (distance <= self.match_distance)),
+            distance - iou,
+            np.inf,
+        )
+        # Greedy assignment, best pair first (at most max_faces iterations)
+        for _ in range(min(cost.shape)):
+            track, face = np.unravel_index(np.argmin(cost), cost.shape)
+            if not np.isfinite(cost[track, face]):
+                break
+            matched[track] = face
+            cost[track, :] = np.inf
+            cost[:, face] = np.inf
+        return matched
+    
+    def _trajectory_shifts(self, state: FaceTrackingState, tracks: np.ndarray):
+        """Compare each updated track's recent positions with its earlier ones."""
+        window = self.smoothing_window
+        tracks = tracks[state.samples[tracks] > window]
+        if len(tracks) == 0:
+            return None, False
+        
+        # Each track's buffer in time order; slots older than the track are masked out
+        size = self.history_size
+        order = (state.samples[tracks, None] - size + np.arange(size)) % size
+        history = state.positions[tracks[:, None], order]
+        valid = np.arange(size) >= size - np.minimum(state.samples[tracks], size)[:, None]
+        recent = np.arange(size) >= size - window
+        earlier = valid & ~recent
+        
+        current = history[:, recent].mean(axis=1)
+        baseline = (history * earlier[..., None]).sum(axis=1) / earlier.sum(axis=1)[:, None]
+        shift = current - baseline
+        
+        # Focus only on horizontal (x) movement for tilt detection
+        x_shift = shift[:, 0]
+        tilted = np.abs(x_shift) > self.tilt_threshold
+        moved = np.hypot(shift[:, 0], shift[:, 1]) > self.movement_threshold
+        
+        # A track that tilted or moved starts over from where it is now, so holding
+        # the new pose doesn't keep reporting it
+        reset = tilted | moved
+        state.positions[tracks[reset]] = current[reset][:, None, :]
+        
+        tilt_direction = None
+        if tilted.any():
+            strongest = x_shift[tilted][np.argmax(np.abs(x_shift[tilted]))]
+            tilt_direction = "left" if strongest > 0 else "right"
+        return tilt_direction, bool(moved.any())
+    
+    def _detect_faces(self, gray, state: FaceTrackingState):
+        """Run the face cascade, using the tracking ROI and working resolution when enabled."""
+        height, width = gray.shape[:2]
+        scale = 1.0
+        if self.working_width and width > self.working_width:
+            scale = self.working_width / width
+            gray = cv2.resize(gray, (self.working_width, int(round(height * scale))), interpolation=cv2.INTER_AREA)
+        min_size = max(24, int(round(30 * scale)))
+        
+        faces = None
+        if self.tracking and state.last_face_box is not None and state.frames_since_full_scan < self.full_scan_interval:
+            faces = self._detect_in_roi(gray, state.last_face_box, min_size)
+            state.frames_since_full_scan += 1
+        if faces is None:
+            faces = self.face_cascade.detectMultiScale(
+                gray,
+                scaleFactor=self.scale_factor,
+                minNeighbors=self.min_neighbors,
+                minSize=(min_size, min_size)
+            )
+            state.frames_since_full_scan = 0
+        
+        faces = np.asarray(faces, dtype=np.float64).reshape(-1, 4)
+        if self.tracking:
+            # Only a single face is followed with an ROI; anything else needs full scans
+            small_height, small_width = gray.shape[:2]
+            state.last_face_box = (
+                tuple(float(v) for v in faces[0] / (small_width, small_height, small_width, small_height))
+                if len(faces) == 1 else None
+            )
+        return np.round(faces / scale).astype(int)
+    
+    def _detect_in_roi(self, gray, face_box, min_size):
+        """Search a padded region around the last face; returns None if the face was lost."""
+        height, width = gray.shape[:2]
+        x, y, w, h = face_box[0] * width, face_box[1] * height, face_box[2] * width, face_box[3] * height
+        pad_x, pad_y = w * self.roi_padding, h * self.roi_padding
+        x0, y0 = max(0, int(x - pad_x)), max(0, int(y - pad_y))
+        x1, y1 = min(width, int(x + w + pad_x)), min(height, int(y + h + pad_y))
+        if x1 - x0 < min_size or y1 - y0 < min_size:
+            return None
+        
+        faces = self.face_cascade.detectMultiScale(
+            gray[y0:y1, x0:x1],
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(min_size, min_size)
+        )
+        if len(faces) != 1:
+            return None
+        return np.asarray(faces) + (x0, y0, 0, 0)
+    
+    def _eyes_missing(self, gray, face) -> bool:
+        x, y, w, h = face
+        roi_gray = gray[y:y+h, x:x+w]
+        eyes = self.eye_cascade.detectMultiScale(roi_gray)
+        return len(eyes) == 0
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from face_detector import FaceDetector, FaceTrackingState
+from pipeline import process_stage
+from session_store import SessionStateStore
+
+# The detector owned by this worker process (see _init_worker)
+_detector: Optional[FaceDetector] = None
+
+
+def _init_worker(detector_params: Dict[str, Any]):
+    """Process-pool initializer: load the cascades once per worker."""
+    global _detector
+    _detector = FaceDetector(**detector_params)
+
+
+def _process_encoded_frame(image_bytes: bytes, state: FaceTrackingState) -> Tuple[Dict[str, Any], FaceTrackingState, Dict[str, float]]:
+    """Decode a JPEG/PNG frame and run detection against the session's state."""
+    start = time.perf_counter()
+    frame = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    timings = {"imdecode": time.perf_counter() - start}
+    results = _detector.process_frame(frame, state, timings)
+    return results, state, timings
+
+
+def _warm_up_worker():
+    """Run one blank frame through the worker's detector so OpenCV's first call is paid now."""
+    _detector.process_frame(np.zeros((240, 320, 3), np.uint8), FaceTrackingState())
+
+
+class FaceEngine:
+    """
+    Shared face-detection engine for all proctored sessions.
+
+    Frames from every session go into one process pool (sized to the CPU cores
+    by default) whose workers each hold a single set of loaded cascades. Only the
+    encoded frame and the session's small FaceTrackingState cross the process
+    boundary; the updated state comes back with the results and is saved in the
+    session state store.
+    """
+
+    def __init__(self, workers: int, detector_params: Dict[str, Any], state_store: SessionStateStore):
+        self.stage = process_stage("face", workers, initializer=_init_worker, initargs=(detector_params,))
+        self.state_store = state_store
+        # Locks only exist while a session has frames in flight on this worker
+        self.locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+    async def process(self, session_id: str, image_bytes: bytes, timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """Run detection on one frame of a session; per-stage durations go into timings if given."""
+        # Frames of one session are processed in order so its state stays consistent
+        lock, users = self.locks.get(session_id, (asyncio.Lock(), 0))
+        self.locks[session_id] = (lock, users + 1)
+        try:
+            async with lock:
+                async def detect(saved):
+                    results, state, worker_timings = await self.stage.run(
+                        _process_encoded_frame, image_bytes, FaceTrackingState.from_dict(saved)
+                    )
+                    return state.to_dict(), (results, worker_timings)
+
+                # Another worker may have saved the session's state meanwhile; the frame is then run again on that
+                results, worker_timings = await self.state_store.update(session_id, detect)
+                if timings is not None:
+                    timings.update(worker_timings)
+                return results
+        finally:
+            lock, users = self.locks[session_id]
+            if users == 1:
+                del self.locks[session_id]
+            else:
+                self.locks[session_id] = (lock, users - 1)
+
+    async def warm_up(self):
+        """Start all worker processes (loading their cascades) before the first frame arrives."""
+        await self.stage.warm_up(_warm_up_worker)
+
+    def shutdown(self, wait: bool = False):
+        self.stage.shutdown(wait)
@@ -32,6 +32,12 @@ const MicChat = () => {
     generic: null
   });
   const faceDetectionIntervalRef = useRef(null);
+  const faceSocketRef = useRef(null);
+  const keyboardSocketRef = useRef(null);
+  const keyEventBufferRef = useRef([]);
+  const keyboardFlushIntervalRef = useRef(null);
+  const audioQueueRef = useRef([]);
+  const isPlayingRef = useRef(false);
   const lastToastTimeRef = useRef({
     keyboard: 0,
     faceTilt: 0,
@@ -66,6 +72,9 @@ const MicChat = () => {
       window.addEventListener('keydown', handleKeyDown, true);
       window.addEventListener('keyup', handleKeyUp, true);
       
+      // Send buffered keyboard events in batches
+      startKeyboardTracking();
+      
       // Start face detection when session is active
       startFaceDetection();
       
@@ -73,56 +82,59 @@ const MicChat = () => {
         window.removeEventListener('keydown', handleKeyDown, true);
         window.removeEventListener('keyup', handleKeyUp, true);
         
-        // Clean up face detection interval
+        // Flush remaining keyboard events and close the socket
+        if (keyboardFlushIntervalRef.current) {
+          clearInterval(keyboardFlushIntervalRef.current);
+        }
+        flushKeyboardEvents();
+        if (keyboardSocketRef.current) {
+          keyboardSocketRef.current.close();
+          keyboardSocketRef.current = null;
+        }
+        
+        // Clean up face detection interval and socket
         if (faceDetectionIntervalRef.current) {
           clearInterval(faceDetectionIntervalRef.current);
         }
+        if (faceSocketRef.current) {
+          faceSocketRef.current.close();
+          faceSocketRef.current = null;
+        }
       };
     }
   }, [sessionId]);
 
   
 
-  // Start face detection monitoring - increased interval to reduce processing frequency
+  // Start face detection monitoring - frames are streamed as binary JPEGs over a WebSocket
   const startFaceDetection = () => {
     if (faceDetectionIntervalRef.current) {
       clearInterval(faceDetectionIntervalRef.current);
     }
+    if (faceSocketRef.current) {
+      faceSocketRef.current.close();
+    }
+
+    const socket = new WebSocket(`ws://localhost:8000/ws/face?session_id=${sessionId}`);
+    socket.onmessage = (event) => handleFaceResults(JSON.parse(event.data));
+    socket.onerror = (error) => console.error('Face detection socket error:', error);
+    faceSocketRef.current = socket;
     
     faceDetectionIntervalRef.current = setInterval(() => {
-      if (webcamRef.current && sessionId) {
-        const screenshot = webcamRef.current.getScreenshot();
-        if (screenshot) {
-          // Remove the data:image/jpeg;base64, prefix
-          const base64Image = screenshot.split(',')[1];
-          processFaceDetection(base64Image);
+      const canvas = webcamRef.current && webcamRef.current.getCanvas();
+      // Skip this frame if the previous one is still being sent
+      if (!canvas || socket.readyState !== WebSocket.OPEN || socket.bufferedAmount > 0) return;
+      canvas.toBlob((blob) => {
+        if (blob && socket.readyState === WebSocket.OPEN) {
+          socket.send(blob);
         }
-      }
+      }, "image/jpeg", 0.8);
     }, 2000); // Check every 2 seconds instead of every second to reduce processing
   };
 
-  // Process face detection with focus on tilt detection
-  const processFaceDetection = async (base64Image) => {
-    if (!sessionId) return;
-    
+  // Handle face detection results with focus on tilt detection
+  const handleFaceResults = (data) => {
     try {
-      const response = await fetch(`http://localhost:8000/process-face?session_id=${sessionId}`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          image: base64Image
-        }),
-      });
-      
-      if (!response.ok) {
-        console.error(`Face detection error: ${response.status}`);
-        return;
-      }
-      
-      const data = await response.json();
-      
       // Process face detection warnings with rate limiting
       if (data.warnings && data.warnings.length > 0) {
         // Only process specific warnings we care about
@@ -244,24 +256,62 @@ const MicChat = () => {
     }
   };
 
-  // Track keyboard events via API
-  const trackKeyboardEvent = async (eventData) => {
+  // Keyboard events are buffered and sent as one batch every 250 ms
+  const startKeyboardTracking = () => {
+    const socket = new WebSocket(`ws://localhost:8000/ws/keyboard?session_id=${sessionId}`);
+    socket.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.warnings && data.warnings.length > 0) {
+        showKeyboardWarning(data.warnings);
+      }
+    };
+    socket.onerror = (error) => console.error('Keyboard tracking socket error:', error);
+    keyboardSocketRef.current = socket;
+
+    if (keyboardFlushIntervalRef.current) {
+      clearInterval(keyboardFlushIntervalRef.current);
+    }
+    keyboardFlushIntervalRef.current = setInterval(flushKeyboardEvents, 250);
+  };
+
+  const trackKeyboardEvent = (eventData) => {
+    keyEventBufferRef.current.push(eventData);
+  };
+
+  const flushKeyboardEvents = async () => {
+    const events = keyEventBufferRef.current;
+    if (events.length === 0) return;
+    keyEventBufferRef.current = [];
+
+    const socket = keyboardSocketRef.current;
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify(events));
+      return;
+    }
+
+    // Fall back to the batch endpoint while the socket isn't connected
     try {
-      const response = await fetch(`http://localhost:8000/track-keyboard?session_id=${sessionId}`, {
+      const response = await fetch(`http://localhost:8000/track-keyboard/batch?session_id=${sessionId}`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify(eventData),
+        body: JSON.stringify(events),
       });
       
+      // Rate limited: keep the events for the next flush
+      if (response.status === 429) {
+        keyEventBufferRef.current = events.concat(keyEventBufferRef.current);
+        return;
+      }
+      
       const data = await response.json();
       
       if (data.warnings && data.warnings.length > 0) {
         showKeyboardWarning(data.warnings);
       }
     } catch (error) {
-      console.error('Error tracking keyboard event:', error);
+      console.error('Error tracking keyboard events:', error);
     }
   };
 
@@ -345,49 +395,57 @@ const MicChat = () => {
     }
   };
 
+  // Play streamed audio chunks one after another as they arrive
+  const enqueueAudio = (audioData) => {
+    const audioBlobResponse = new Blob([audioData], { type: "audio/mpeg" });
+    const newAudioUrl = URL.createObjectURL(audioBlobResponse);
+    setAudioUrl(newAudioUrl);
+    audioQueueRef.current.push(newAudioUrl);
+    playNextAudio();
+  };
+
+  const playNextAudio = () => {
+    if (isPlayingRef.current || audioQueueRef.current.length === 0) return;
+    isPlayingRef.current = true;
+    const audio = new Audio(audioQueueRef.current.shift());
+    audio.onended = audio.onerror = () => {
+      isPlayingRef.current = false;
+      playNextAudio();
+    };
+    audio.play().catch(() => {
+      isPlayingRef.current = false;
+      playNextAudio();
+    });
+  };
+
   const sendAudio = async (audioBlob = null) => {
     if (!sessionId) return;
     resetTimer(); 
 
-    const formData = new FormData();
-      
-    if (audioBlob) {
-      formData.append("file", audioBlob, "audio.wav"); 
-    }
-    formData.append("isTimeCompleted", isTimeCompleted.toString());
-    try {
-      const response = await fetch(`http://localhost:8000/talk?session_id=${sessionId}`, {
-        method: "POST",
-        body: formData,
-      });
+    const timedOut = isTimeCompleted || !audioBlob;
+    const socket = new WebSocket(`ws://localhost:8000/ws/talk?session_id=${sessionId}`);
+    socket.binaryType = "arraybuffer";
 
-      if (!response.ok) {
-        throw new Error(`Server error urgent check: ${response.status}`);
+    socket.onopen = async () => {
+      // Either the recorded answer as binary, or a timeout notice as JSON
+      if (timedOut) {
+        // turn_id lets the server tell a resent notice from the next timed-out turn
+        socket.send(JSON.stringify({ isTimeCompleted: true, turn_id: crypto.randomUUID() }));
+      } else {
+        socket.send(await audioBlob.arrayBuffer());
       }
-      
-      // Read the audio stream
-      const reader = response.body.getReader();
-      const chunks = [];
-      let done = false;
-  
-      while (!done) {
-        const { value, done: readerDone } = await reader.read();
-        if (value) {
-          chunks.push(value);
-        }
-        done = readerDone;
+    };
+
+    socket.onmessage = (event) => {
+      if (typeof event.data !== "string") {
+        enqueueAudio(event.data);
+        return;
       }
-  
-      // Create a new audio blob
-      const audioBlobResponse = new Blob(chunks, { type: "audio/mpeg" });
-      const newAudioUrl = URL.createObjectURL(audioBlobResponse);
-      setAudioUrl(newAudioUrl);
-    
-      setTimeout(() => {
-        const audio = new Audio(newAudioUrl);
-        audio.play();
-      }, 100);
-  
+
+      const message = JSON.parse(event.data);
+      if (message.type !== "done") return;
+      socket.close();
+
       const lastMessage = messages.length > 0 ? messages[messages.length - 1] : null;
   
       if (lastMessage && lastMessage.role !== "user") {
@@ -397,9 +455,11 @@ const MicChat = () => {
       }
   
       fetchChatHistory(sessionId);
-    } catch (error) {
+    };
+
+    socket.onerror = (error) => {
       console.error("Error sending audio:", error);
-    }
+    };
   };
 
   const endInterview = () => {
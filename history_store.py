@@ -0,0 +1,286 @@
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import ConnectionError, TimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean Redis is (briefly) unreachable, as opposed to a bad command
+UNAVAILABLE = (ConnectionError, TimeoutError)
+
+# RPUSH ARGV onto KEYS[1] only if the list doesn't exist (e.g. it expired); returns
+# how many messages were pushed
+SEED_IF_EMPTY = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+return redis.call('RPUSH', KEYS[1], unpack(ARGV))
+"""
+
+
+class ChatHistoryStore:
+    """
+    Chat history kept as a Redis list with one JSON entry per message.
+
+    Appending a turn is a single MULTI/EXEC round trip (RPUSH + EXPIRE), so it
+    never rewrites the conversation and concurrent turns can't drop messages.
+    Idle sessions expire after ttl seconds.
+
+    Sessions in use on this worker are mirrored locally (at most local_sessions
+    sessions, and the first and last local_window messages of each). While Redis
+    is unreachable, reads are served from the mirror and writes are buffered in
+    it in full; the buffered writes are replayed on the session's next successful
+    operation, so a Redis blip degrades the prompt instead of failing the turn.
+    Sessions with unsynced writes are evicted from the mirror last.
+
+    Appends may carry a seed (the system prompt) that is written first, in the
+    same transaction, when the history no longer exists because it expired.
+    """
+
+    def __init__(self, client: redis.Redis, ttl: int = 7200, local_sessions: int = 1024, local_window: int = 64):
+        self.client = client
+        self.ttl = ttl
+        self.local_sessions = local_sessions
+        self.local_window = local_window
+        self.local: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    @staticmethod
+    def key(session_id: str) -> str:
+        return f"session:{session_id}:messages"
+
+    @staticmethod
+    def summary_key(session_id: str) -> str:
+        return f"session:{session_id}:summary"
+
+    @staticmethod
+    def metrics_key(session_id: str) -> str:
+        return f"session:{session_id}:metrics"
+
+    def _keys(self, session_id: str) -> List[str]:
+        return [self.key(session_id), self.summary_key(session_id), self.metrics_key(session_id)]
+
+    def _mirror(self, session_id: str, create: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Return the session's local mirror (creating an empty one if asked).
+
+        "recent" holds messages [length - len(recent), length) of the history;
+        "pending", "pending_summary" and "pending_metrics" are writes Redis
+        hasn't seen yet, and "recreate" means the session was created while Redis
+        was unreachable (its whole history, from the first message, is pending).
+        "seed" is the seed of the buffered appends.
+        """
+        entry = self.local.get(session_id)
+        if entry is None:
+            if not create:
+                return None
+            entry = self.local[session_id] = {
+                "first": None, "recent": [], "length": 0, "summary": {},
+                "recreate": False, "pending": [], "pending_summary": False, "pending_metrics": [], "seed": [],
+            }
+        self.local.move_to_end(session_id)
+        while len(self.local) > self.local_sessions:
+            # Evict the least recently used session that Redis is up to date with
+            evicted = next(
+                (sid for sid, old in self.local.items() if sid != session_id and not self._unsynced(old)), None
+            )
+            if evicted is None:
+                evicted = next(iter(self.local))
+                logger.error("Local history full of unsynced sessions, dropping buffered writes of session %s", evicted)
+            del self.local[evicted]
+        return entry
+
+    @staticmethod
+    def _unsynced(entry: Dict[str, Any]) -> bool:
+        return bool(entry["recreate"] or entry["pending"] or entry["pending_summary"] or entry["pending_metrics"])
+
+    def _extend(self, entry: Dict[str, Any], messages) -> None:
+        entry["recent"] = (entry["recent"] + list(messages))[-self.local_window:]
+        entry["length"] += len(messages)
+
+    def _reseed(self, entry: Dict[str, Any], seed: List[Dict[str, Any]]) -> None:
+        """Reset the mirror of a history that was found missing and started again from seed."""
+        entry.update(first=seed[0], recent=[], length=0, summary={})
+        self._extend(entry, seed)
+
+    async def _flush(self, session_id: str):
+        """Replay writes buffered while Redis was unavailable (raises if it still is)."""
+        entry = self.local.get(session_id)
+        if not entry or not self._unsynced(entry):
+            return
+        pipe = self.client.pipeline(transaction=True)
+        if entry["recreate"]:
+            pipe.delete(*self._keys(session_id))
+        elif entry["pending"] and entry["seed"]:
+            pipe.eval(SEED_IF_EMPTY, 1, self.key(session_id), *[json.dumps(message) for message in entry["seed"]])
+        if entry["pending"]:
+            pipe.rpush(self.key(session_id), *[json.dumps(message) for message in entry["pending"]])
+        if entry["pending_summary"]:
+            pipe.hset(self.summary_key(session_id), mapping=entry["summary"])
+        if entry["pending_metrics"]:
+            pipe.rpush(self.metrics_key(session_id), *[json.dumps(metrics) for metrics in entry["pending_metrics"]])
+        for key in self._keys(session_id):
+            pipe.expire(key, self.ttl)
+        await pipe.execute()
+        entry.update(recreate=False, pending=[], pending_summary=False, pending_metrics=[], seed=[])
+        logger.info("Replayed buffered history writes of session %s", session_id)
+
+    async def create(self, session_id: str, messages: List[Dict[str, Any]]):
+        """Start a session's history, replacing anything stored under the same ID."""
+        self.local.pop(session_id, None)
+        entry = self._mirror(session_id, create=True)
+        entry["first"] = messages[0] if messages else None
+        self._extend(entry, messages)
+        try:
+            pipe = self.client.pipeline(transaction=True)
+            pipe.delete(*self._keys(session_id))
+            pipe.rpush(self.key(session_id), *[json.dumps(message) for message in messages])
+            pipe.expire(self.key(session_id), self.ttl)
+            await pipe.execute()
+        except UNAVAILABLE as e:
+            logger.warning("Redis unavailable, creating session %s locally: %s", session_id, e)
+            entry.update(recreate=True, pending=list(messages))
+
+    async def append(self, session_id: str, *messages: Dict[str, Any], seed: Optional[List[Dict[str, Any]]] = None):
+        """
+        Atomically append messages and refresh the session's idle TTL.
+
+        If the history doesn't exist (it expired, or was never created), it is
+        started with the seed messages first.
+        """
+        entry = self._mirror(session_id)
+        try:
+            await self._flush(session_id)
+            pipe = self.client.pipeline(transaction=True)
+            if seed:
+                pipe.eval(SEED_IF_EMPTY, 1, self.key(session_id), *[json.dumps(message) for message in seed])
+            pipe.rpush(self.key(session_id), *[json.dumps(message) for message in messages])
+            for key in self._keys(session_id):
+                pipe.expire(key, self.ttl)
+            results = await pipe.execute()
+            if seed and results[0] and entry:
+                logger.info("History of session %s had expired, starting it again from the system prompt", session_id)
+                self._reseed(entry, seed)
+        except UNAVAILABLE as e:
+            logger.warning("Redis unavailable, buffering turn of session %s: %s", session_id, e)
+            entry = entry or self._mirror(session_id, create=True)
+            entry["pending"].extend(messages)
+            if seed and not entry["seed"]:
+                entry["seed"] = list(seed)
+                if not entry["length"]:
+                    self._reseed(entry, seed)
+        if entry:
+            self._extend(entry, messages)
+
+    async def load(self, session_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Read messages [offset, offset + limit) — the whole history when limit is None."""
+        if limit is not None and limit <= 0:
+            return []
+        end = -1 if limit is None else offset + limit - 1
+        try:
+            await self._flush(session_id)
+            return [json.loads(entry) for entry in await self.client.lrange(self.key(session_id), offset, end)]
+        except UNAVAILABLE as e:
+            logger.warning("Redis unavailable, reading local history of session %s: %s", session_id, e)
+            entry = self._mirror(session_id)
+            if not entry:
+                return []
+            # Only the mirrored part of [offset, end] can be returned
+            start = entry["length"] - len(entry["recent"])
+            stop = entry["length"] if limit is None else min(entry["length"], offset + limit)
+            return entry["recent"][max(offset, start) - start:max(stop - start, 0)]
+
+    async def load_window(self, session_id: str, size: int) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], int, Dict[str, str]]:
+        """
+        Read what's needed to build an LLM prompt in one round trip.
+
+        Returns (first message, last `size` messages, history length, summary hash).
+        """
+        try:
+            await self._flush(session_id)
+            pipe = self.client.pipeline(transaction=False)
+            pipe.lindex(self.key(session_id), 0)
+            pipe.lrange(self.key(session_id), -size, -1)
+            pipe.llen(self.key(session_id))
+            pipe.hgetall(self.summary_key(session_id))
+            first, tail, length, summary = await pipe.execute()
+        except UNAVAILABLE as e:
+            logger.warning("Redis unavailable, building prompt from local history of session %s: %s", session_id, e)
+            entry = self._mirror(session_id)
+            if not entry:
+                return None, [], 0, {}
+            return entry["first"], entry["recent"][-size:], entry["length"], dict(entry["summary"])
+
+        first = json.loads(first) if first else None
+        tail = [json.loads(entry) for entry in tail]
+        # Remember the window so the next turns can still be built if Redis goes away
+        entry = self._mirror(session_id, create=True)
+        entry.update(first=first, recent=tail[-self.local_window:], length=length, summary=summary)
+        return first, tail, length, summary
+
+    async def length(self, session_id: str) -> int:
+        try:
+            await self._flush(session_id)
+            return await self.client.llen(self.key(session_id))
+        except UNAVAILABLE:
+            entry = self._mirror(session_id)
+            return entry["length"] if entry else 0
+
+    async def summary_state(self, session_id: str) -> Tuple[int, Dict[str, str]]:
+        """Return (history length, summary hash)."""
+        try:
+            await self._flush(session_id)
+            pipe = self.client.pipeline(transaction=False)
+            pipe.llen(self.key(session_id))
+            pipe.hgetall(self.summary_key(session_id))
+            length, summary = await pipe.execute()
+            return length, summary
+        except UNAVAILABLE:
+            entry = self._mirror(session_id)
+            return (entry["length"], dict(entry["summary"])) if entry else (0, {})
+
+    async def set_summary(self, session_id: str, text: str, covered: int):
+        """Store the rolling summary and how many messages (after the first) it covers."""
+        summary = {"text": text, "covered": str(covered)}
+        entry = self._mirror(session_id)
+        if entry:
+            entry["summary"] = summary
+        try:
+            await self._flush(session_id)
+            pipe = self.client.pipeline(transaction=True)
+            pipe.hset(self.summary_key(session_id), mapping=summary)
+            pipe.expire(self.summary_key(session_id), self.ttl)
+            await pipe.execute()
+        except UNAVAILABLE as e:
+            logger.warning("Redis unavailable, buffering summary of session %s: %s", session_id, e)
+            entry = entry or self._mirror(session_id, create=True)
+            entry.update(summary=summary, pending_summary=True)
+
+    async def append_metrics(self, session_id: str, metrics: Dict[str, Any]):
+        try:
+            await self._flush(session_id)
+            pipe = self.client.pipeline(transaction=True)
+            pipe.rpush(self.metrics_key(session_id), json.dumps(metrics))
+            pipe.expire(self.metrics_key(session_id), self.ttl)
+            await pipe.execute()
+        except UNAVAILABLE:
+            entry = self._mirror(session_id, create=True)
+            entry["pending_metrics"].append(metrics)
+
+    async def load_metrics(self, session_id: str) -> List[Dict[str, Any]]:
+        try:
+            await self._flush(session_id)
+            return [json.loads(entry) for entry in await self.client.lrange(self.metrics_key(session_id), 0, -1)]
+        except UNAVAILABLE:
+            entry = self._mirror(session_id)
+            return list(entry["pending_metrics"]) if entry else []
+
+    async def clear(self, session_id: str, *extra_keys: str):
+        """Delete the session's history, plus any other keys of the session, in one DEL."""
+        self.local.pop(session_id, None)
+        try:
+            await self.client.delete(*self._keys(session_id), *extra_keys)
+        except UNAVAILABLE as e:
+            logger.warning("Redis unavailable, session %s will only be cleared when it expires: %s", session_id, e)
@@ -0,0 +1,161 @@
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+
+
+class KeyboardTracker:
+    def __init__(self):
+        self.active = True
+        self.allowed_keys = set([
+            # Navigation keys
+            "ArrowUp", "ArrowDown", "ArrowLeft", "ArrowRight", 
+            "Home", "End", "PageUp", "PageDown",
+            # Form navigation
+            "Tab", "Enter", "Escape", "Space",
+            # Number keys (for multiple choice)
+            "1", "2", "3", "4", "5", "6", "7", "8", "9", "0",
+            # Letter keys for typing answers
+            "a", "b", "c", "d", "e", "f", "g", "h", "i", "j", "k", "l", "m",
+            "n", "o", "p", "q", "r", "s", "t", "u", "v", "w", "x", "y", "z",
+            "A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L", "M",
+            "N", "O", "P", "Q", "R", "S", "T", "U", "V", "W", "X", "Y", "Z",
+            # Punctuation for typing
+            ".", ",", "!", "?", ":", ";", "-", "(", ")", "[", "]", "'", "\"",
+            # Common modifier keys
+            "Shift", "Control"
+        ])
+        
+        self.forbidden_key_combinations = [
+            ["Control", "c"], # Copy
+            ["Control", "v"], # Paste
+            ["Control", "x"], # Cut
+            ["Control", "f"], # Find
+            ["Alt", "Tab"], # Switch windows
+            ["Control", "Tab"], # Switch tabs
+            ["Control", "t"], # New tab
+            ["Control", "n"], # New window
+            ["F12"], # Developer tools
+            ["Control", "Shift", "i"], # Developer tools
+            ["Control", "Shift", "j"], # Developer tools
+        ]
+        
+        self._compile_combinations()
+        
+        self.active_keys = set()
+        self.history_size = 20
+        self.key_history = deque(maxlen=self.history_size)
+        self.last_warning_time = 0
+        self.warning_cooldown = 2  # Seconds between warnings
+        # Client timestamps are trusted up to the time the server received them and
+        # at most max_event_age seconds before it (events wait in client batches)
+        self.max_event_age = 60
+    
+    def to_state(self) -> Dict[str, Any]:
+        """Return the compact, JSON-serializable per-session part of the tracker."""
+        return {
+            "active": self.active,
+            "active_keys": sorted(self.active_keys),
+            "key_history": list(self.key_history),
+            "last_warning_time": self.last_warning_time,
+        }
+    
+    @classmethod
+    def from_state(cls, state: Optional[Dict[str, Any]]) -> "KeyboardTracker":
+        """Rebuild a tracker from to_state() output (a fresh tracker for None)."""
+        tracker = cls()
+        if state:
+            tracker.active = state.get("active", True)
+            tracker.active_keys = set(state.get("active_keys", []))
+            tracker.key_history.extend(state.get("key_history", []))
+            tracker.last_warning_time = state.get("last_warning_time", 0)
+        return tracker
+    
+    def set_allowed_keys(self, keys: List[str]):
+        """Set the list of allowed keys."""
+        self.allowed_keys = set(keys)
+    
+    def set_forbidden_key_combinations(self, combinations: List[List[str]]):
+        """Set the list of forbidden key combinations."""
+        self.forbidden_key_combinations = combinations
+        self._compile_combinations()
+    
+    def _compile_combinations(self):
+        """
+        Index forbidden combinations by each key they contain.
+
+        A keydown can only complete combinations that include the pressed key, so
+        only those are checked instead of every combination on every event.
+        """
+        self.combinations_by_key: Dict[str, List[Tuple[str, ...]]] = {}
+        for combo in self.forbidden_key_combinations:
+            for key in set(combo):
+                self.combinations_by_key.setdefault(key, []).append(tuple(combo))
+    
+    def track(self, event_data: Dict[str, Any], received: Optional[float] = None) -> Optional[List[str]]:
+        """
+        Track keyboard events and check for violations.
+        
+        Args:
+            event_data: Dictionary containing keyboard event information
+                - event_type: 'keydown', 'keyup'
+                - key: Key that was pressed
+                - timestamp: Event timestamp in milliseconds (optional, defaults to now)
+            received: When the server received the event, in seconds (defaults to now)
+                
+        Returns:
+            List of warning messages or None if no violations
+        """
+        if not self.active:
+            return None
+            
+        warnings = []
+        event_type = event_data.get("event_type")
+        key = event_data.get("key", "")
+        
+        # Use the client's timestamp so cooldowns stay correct when events arrive batched,
+        # clamped so a bogus clock (e.g. a far-future timestamp) can't suppress warnings
+        received = time.time() if received is None else received
+        timestamp = event_data.get("timestamp")
+        current_time = received
+        if isinstance(timestamp, (int, float)):
+            current_time = min(max(timestamp / 1000, received - self.max_event_age), received)
+        
+        # Update active keys
+        if event_type == "keydown":
+            self.active_keys.add(key)
+            
+            # Record key press in history
+            self.key_history.append({
+                "key": key,
+                "time": current_time
+            })
+            
+            # Check if key is allowed
+            if key not in self.allowed_keys and current_time - self.last_warning_time > self.warning_cooldown:
+                warnings.append(f"Unauthorized key pressed: {key}")
+                self.last_warning_time = current_time
+            
+            # Check for forbidden key combinations
+            for combo in self.combinations_by_key.get(key, ()):
+                if self.active_keys.issuperset(combo) and current_time - self.last_warning_time > self.warning_cooldown:
+                    warnings.append(f"Forbidden key combination detected: {'+'.join(combo)}")
+                    self.last_warning_time = current_time
+        
+        elif event_type == "keyup":
+            self.active_keys.discard(key)
+        
+        return warnings if warnings else None
+    
+    def track_batch(self, events: Iterable[Dict[str, Any]]) -> Optional[List[str]]:
+        """
+        Track a batch of keyboard events in order.
+        
+        Returns:
+            The distinct warning messages raised by the batch, or None if no violations
+        """
+        warnings = {}
+        received = time.time()
+        for event_data in events:
+            for warning in self.track(event_data, received) or ():
+                warnings[warning] = None
+        return list(warnings) if warnings else None
@@ -0,0 +1,122 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+
+def token_stats(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract prompt/eval token counts and durations (ms) from a final Ollama response."""
+    return {
+        "prompt_eval_count": payload.get("prompt_eval_count", 0),
+        "eval_count": payload.get("eval_count", 0),
+        "prompt_eval_ms": round(payload.get("prompt_eval_duration", 0) / 1e6, 1),
+        "eval_ms": round(payload.get("eval_duration", 0) / 1e6, 1),
+    }
+
+
+class OllamaClient:
+    """
+    Async client for a local Ollama server.
+
+    A single httpx.AsyncClient is shared by all sessions so the TCP connection to
+    Ollama is pooled and reused between turns instead of reopened per request.
+    Requests go to /api/chat with keep_alive set, so the model stays resident and
+    Ollama can reuse its KV cache for a prompt prefix it has already evaluated.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://127.0.0.1:11434",
+        model: str = "llama2",
+        timeout: float = 30.0,
+        max_concurrency: int = 4,
+        keep_alive: str = "30m",
+    ):
+        self.model = model
+        self.keep_alive = keep_alive
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # Queue depth and in-flight count, exported as gauges (see metrics.track_queue)
+        self.waiting = 0
+        self.running = 0
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+
+    def _payload(self, messages: List[Dict[str, str]], stream: bool) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Hold one of the max_concurrency request slots."""
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+
+    async def chat(self, messages: List[Dict[str, str]]) -> httpx.Response:
+        """
+        Send a non-streaming /api/chat request.
+
+        Returns the raw response so callers can decide how to handle non-200 codes.
+        Raises httpx.HTTPError on connection failures and timeouts.
+        """
+        async with self._slot():
+            return await self.client.post("/api/chat", json=self._payload(messages, stream=False))
+
+    async def stream_chat(self, messages: List[Dict[str, str]], stats: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Send a streaming /api/chat request and yield response tokens as they arrive.
+
+        When stats is given it is filled with token_stats() from the final chunk.
+        Raises httpx.HTTPError on connection failures, timeouts and non-200 responses.
+        """
+        async with self._slot():
+            async with self.client.stream("POST", "/api/chat", json=self._payload(messages, stream=True)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    content = chunk.get("message", {}).get("content")
+                    if content:
+                        yield content
+                    if chunk.get("done"):
+                        if stats is not None:
+                            stats.update(token_stats(chunk))
+                        break
+
+    async def warm_up(self, messages: List[Dict[str, str]]):
+        """
+        Load the model and evaluate a prompt prefix (e.g. the system prompt) ahead of the first turn.
+
+        Only one token is generated. Raises httpx.HTTPError if Ollama can't be reached
+        or the model can't be loaded.
+        """
+        payload = self._payload(messages, stream=False)
+        payload["options"] = {"num_predict": 1}
+        async with self._slot():
+            response = await self.client.post("/api/chat", json=payload)
+        response.raise_for_status()
+
+    async def aclose(self):
+        await self.client.aclose()
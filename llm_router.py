@@ -0,0 +1,283 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from llm_client import OllamaClient, token_stats
+from metrics import LLM_BACKEND_REQUESTS, LLM_CACHE_RESULTS
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    LRU cache of final chat responses for prompts that don't depend on the candidate.
+
+    Entries are keyed by a hash of model + messages and expire after ttl seconds.
+    Concurrent requests for the same prompt share one generation, including its
+    failure (an error response or exception isn't retried once per waiter).
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.flights = SingleFlight()
+
+    @staticmethod
+    def key(model: str, messages: List[Dict[str, str]]) -> str:
+        return hashlib.sha256(json.dumps([model, messages], sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, message: Dict[str, Any]):
+        """Store the response message (token counts are left out; a hit costs no tokens)."""
+        self.entries[key] = (time.monotonic(), {"message": message, "done": True, "cached": True})
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class Backend:
+    """One Ollama instance behind the router, with its health."""
+
+    def __init__(self, client: OllamaClient, name: str):
+        self.client = client
+        self.name = name
+        self.down_until = 0.0
+        self.failures = 0
+
+    @property
+    def outstanding(self) -> int:
+        return self.client.waiting + self.client.running
+
+    @property
+    def healthy(self) -> bool:
+        return self.down_until <= time.monotonic()
+
+
+class OllamaRouter:
+    """
+    Spreads chat requests over several Ollama instances.
+
+    A session sticks to the backend that served it, so that backend keeps its
+    prompt prefix in the KV cache. It only moves if the backend is down or has
+    more than sticky_slack requests outstanding beyond the least loaded one.
+    New sessions (and requests without a session) go to the healthy backend with
+    the fewest outstanding requests.
+
+    A backend that times out, can't be reached or answers 5xx is skipped for
+    `cooldown` seconds, and the request fails over to the next backend (at most
+    `retries` times). A streamed response only fails over before its first token.
+
+    Requests marked cacheable are answered from a ResponseCache when the same
+    prompt has been answered before. The router has the same interface as
+    OllamaClient, so it can be used wherever one is expected.
+    """
+
+    def __init__(
+        self,
+        clients: List[OllamaClient],
+        names: Optional[List[str]] = None,
+        retries: int = 1,
+        cooldown: float = 10.0,
+        sticky_slack: int = 4,
+        max_sessions: int = 1024,
+        cache: Optional[ResponseCache] = None,
+    ):
+        names = names or [str(client.client.base_url) for client in clients]
+        self.backends = [Backend(client, name) for client, name in zip(clients, names)]
+        self.model = clients[0].model
+        self.retries = retries
+        self.cooldown = cooldown
+        self.sticky_slack = sticky_slack
+        self.max_sessions = max_sessions
+        self.cache = cache
+        self.sessions: "OrderedDict[str, Backend]" = OrderedDict()
+        self.pinned: Counter = Counter()
+
+    # Queue depth and in-flight count over all backends (see metrics.track_queue)
+    @property
+    def waiting(self) -> int:
+        return sum(backend.client.waiting for backend in self.backends)
+
+    @property
+    def running(self) -> int:
+        return sum(backend.client.running for backend in self.backends)
+
+    def _pin(self, session_id: str, backend: Backend):
+        previous = self.sessions.pop(session_id, None)
+        if previous is not None:
+            self.pinned[previous.name] -= 1
+        self.sessions[session_id] = backend
+        self.pinned[backend.name] += 1
+        while len(self.sessions) > self.max_sessions:
+            _, evicted = self.sessions.popitem(last=False)
+            self.pinned[evicted.name] -= 1
+
+    def _pick(self, session_id: Optional[str], tried: List[Backend]) -> Optional[Backend]:
+        """Choose the backend for the next attempt (None once every backend was tried)."""
+        candidates = [backend for backend in self.backends if backend not in tried]
+        if not candidates:
+            return None
+        # With every backend down, try the one that has been down the longest
+        healthy = [backend for backend in candidates if backend.healthy] or [min(candidates, key=lambda b: b.down_until)]
+        least = min(healthy, key=lambda backend: (backend.outstanding, self.pinned[backend.name]))
+        if session_id is None:
+            return least
+
+        sticky = self.sessions.get(session_id)
+        if sticky in healthy and sticky.outstanding <= least.outstanding + self.sticky_slack:
+            self.sessions.move_to_end(session_id)
+            return sticky
+        if sticky is not None and not tried:
+            logger.info("Moving session %s from %s to %s", session_id, sticky.name, least.name)
+        self._pin(session_id, least)
+        return least
+
+    def _succeeded(self, backend: Backend):
+        backend.failures = 0
+        LLM_BACKEND_REQUESTS.labels(backend.name, "ok").inc()
+
+    def _failed(self, backend: Backend, reason: Any):
+        backend.failures += 1
+        backend.down_until = time.monotonic() + self.cooldown
+        LLM_BACKEND_REQUESTS.labels(backend.name, "error").inc()
+        logger.warning("Ollama backend %s failed (%s), skipping it for %.0fs", backend.name, reason, self.cooldown)
+
+    def discard(self, session_id: str):
+        """Forget which backend a session is pinned to."""
+        backend = self.sessions.pop(session_id, None)
+        if backend is not None:
+            self.pinned[backend.name] -= 1
+
+    async def chat(self, messages: List[Dict[str, str]], session_id: Optional[str] = None, cacheable: bool = False) -> httpx.Response:
+        """
+        Send a non-streaming /api/chat request, failing over between backends.
+
+        Returns the raw response of the last attempt (a cached one for a cache
+        hit). Raises httpx.HTTPError if the last backend tried couldn't be reached.
+        """
+        if not (cacheable and self.cache):
+            return await self._chat(messages, session_id)
+
+        key = self.cache.key(self.model, messages)
+
+        def cached() -> Optional[httpx.Response]:
+            entry = self.cache.get(key)
+            return httpx.Response(200, json=entry) if entry is not None else None
+
+        async def generate() -> httpx.Response:
+            response = await self._chat(messages, session_id)
+            try:
+                message = response.json().get("message") if response.status_code == 200 else None
+            except ValueError:
+                message = None
+            if message and message.get("content"):
+                self.cache.put(key, message)
+            return response
+
+        # Requests for a prompt that is being generated share that generation
+        response, outcome = await self.cache.flights.run(key, generate, cached)
+        LLM_CACHE_RESULTS.labels(outcome).inc()
+        return response
+
+    async def _chat(self, messages: List[Dict[str, str]], session_id: Optional[str]) -> httpx.Response:
+        tried = []
+        while True:
+            backend = self._pick(session_id, tried)
+            tried.append(backend)
+            last = len(tried) > self.retries or len(tried) == len(self.backends)
+            try:
+                response = await backend.client.chat(messages)
+            except httpx.TransportError as e:
+                self._failed(backend, repr(e))
+                if last:
+                    raise
+                continue
+            if response.status_code >= 500:
+                self._failed(backend, f"status {response.status_code}")
+                if not last:
+                    continue
+            else:
+                self._succeeded(backend)
+            return response
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        stats: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+        cacheable: bool = False,
+    ) -> AsyncIterator[str]:
+        """
+        Send a streaming /api/chat request and yield response tokens as they arrive.
+
+        Fails over to another backend only if nothing was yielded yet; a cache hit
+        is yielded as a single piece. Raises httpx.HTTPError like OllamaClient.stream_chat.
+        """
+        key = self.cache.key(self.model, messages) if cacheable and self.cache else None
+        if key:
+            cached = self.cache.get(key)
+            LLM_CACHE_RESULTS.labels("miss" if cached is None else "hit").inc()
+            if cached is not None:
+                if stats is not None:
+                    stats.update(token_stats(cached), cached=True)
+                yield cached["message"]["content"]
+                return
+
+        tried = []
+        while True:
+            backend = self._pick(session_id, tried)
+            tried.append(backend)
+            last = len(tried) > self.retries or len(tried) == len(self.backends)
+            tokens = []
+            try:
+                async for token in backend.client.stream_chat(messages, stats):
+                    tokens.append(token)
+                    yield token
+            except httpx.HTTPError as e:
+                retryable = isinstance(e, httpx.TransportError) or (
+                    isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500
+                )
+                if retryable:
+                    self._failed(backend, repr(e))
+                if tokens or last or not retryable:
+                    raise
+                continue
+            self._succeeded(backend)
+            if key and tokens:
+                self.cache.put(key, {"role": "assistant", "content": "".join(tokens)})
+            return
+
+    async def warm_up(self, messages: List[Dict[str, str]]):
+        """
+        Warm up every backend (see OllamaClient.warm_up).
+
+        Backends that fail are skipped for now; raises only if none could be warmed up.
+        """
+        results = await asyncio.gather(
+            *(backend.client.warm_up(messages) for backend in self.backends), return_exceptions=True
+        )
+        for backend, result in zip(self.backends, results):
+            if isinstance(result, Exception):
+                self._failed(backend, repr(result))
+        if all(isinstance(result, Exception) for result in results):
+            raise results[0]
+
+    async def aclose(self):
+        await asyncio.gather(*(backend.client.aclose() for backend in self.backends))
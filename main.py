@@ -1,128 +1,230 @@
-from fastapi import FastAPI, UploadFile, Query, Form, BackgroundTasks
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, Request, UploadFile, Query, Form, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from typing import Optional, Dict, Any, List
-import speech_recognition as sr
-from pydub import AudioSegment
 from dotenv import load_dotenv
-import pyttsx3
+import asyncio
+import logging
 import os
 import json
-import requests
+import httpx
 import time
 import uuid
 import redis
+import redis.asyncio
 import base64
-import numpy as np
-import cv2
-
-# Import the FaceDetector class
-from face_detector import FaceDetector
+import math
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 # Import the KeyboardTracker class
-class KeyboardTracker:
-    def __init__(self):
-        self.active = True
-        self.allowed_keys = set([
-            # Navigation keys
-            "ArrowUp", "ArrowDown", "ArrowLeft", "ArrowRight", 
-            "Home", "End", "PageUp", "PageDown",
-            # Form navigation
-            "Tab", "Enter", "Escape", "Space",
-            # Number keys (for multiple choice)
-            "1", "2", "3", "4", "5", "6", "7", "8", "9", "0",
-            # Letter keys for typing answers
-            "a", "b", "c", "d", "e", "f", "g", "h", "i", "j", "k", "l", "m",
-            "n", "o", "p", "q", "r", "s", "t", "u", "v", "w", "x", "y", "z",
-            "A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L", "M",
-            "N", "O", "P", "Q", "R", "S", "T", "U", "V", "W", "X", "Y", "Z",
-            # Punctuation for typing
-            ".", ",", "!", "?", ":", ";", "-", "(", ")", "[", "]", "'", "\"",
-            # Common modifier keys
-            "Shift", "Control"
-        ])
-        
-        self.forbidden_key_combinations = [
-            ["Control", "c"], # Copy
-            ["Control", "v"], # Paste
-            ["Control", "x"], # Cut
-            ["Control", "f"], # Find
-            ["Alt", "Tab"], # Switch windows
-            ["Control", "Tab"], # Switch tabs
-            ["Control", "t"], # New tab
-            ["Control", "n"], # New window
-            ["F12"], # Developer tools
-            ["Control", "Shift", "i"], # Developer tools
-            ["Control", "Shift", "j"], # Developer tools
-        ]
-        
-        self.active_keys = set()
-        self.key_history = []
-        self.history_size = 20
-        self.last_warning_time = 0
-        self.warning_cooldown = 2  # Seconds between warnings
-    
-    def set_allowed_keys(self, keys: List[str]):
-        """Set the list of allowed keys."""
-        self.allowed_keys = set(keys)
-    
-    def track(self, event_data: Dict[str, Any]) -> Optional[List[str]]:
-        """
-        Track keyboard events and check for violations.
-        
-        Args:
-            event_data: Dictionary containing keyboard event information
-                - event_type: 'keydown', 'keyup'
-                - key: Key that was pressed
-                - timestamp: Event timestamp
-                
-        Returns:
-            List of warning messages or None if no violations
-        """
-        if not self.active:
-            return None
-            
-        warnings = []
-        event_type = event_data.get("event_type")
-        key = event_data.get("key", "")
-        
-        current_time = time.time()
-        
-        # Update active keys
-        if event_type == "keydown":
-            self.active_keys.add(key)
-            
-            # Record key press in history
-            self.key_history.append({
-                "key": key,
-                "time": current_time
-            })
-            
-            # Trim history if needed
-            if len(self.key_history) > self.history_size:
-                self.key_history = self.key_history[-self.history_size:]
-            
-            # Check if key is allowed
-            if key not in self.allowed_keys and current_time - self.last_warning_time > self.warning_cooldown:
-                warnings.append(f"Unauthorized key pressed: {key}")
-                self.last_warning_time = current_time
-            
-            # Check for forbidden key combinations
-            for combo in self.forbidden_key_combinations:
-                if all(k in self.active_keys for k in combo) and current_time - self.last_warning_time > self.warning_cooldown:
-                    warnings.append(f"Forbidden key combination detected: {'+'.join(combo)}")
-                    self.last_warning_time = current_time
-        
-        elif event_type == "keyup":
-            if key in self.active_keys:
-                self.active_keys.remove(key)
-        
-        return warnings if warnings else None
+from keyboard_tracker import KeyboardTracker
+
+from llm_client import OllamaClient, token_stats
+from llm_router import OllamaRouter, ResponseCache
+from conversation_context import ConversationContext
+from pipeline import process_stage, thread_stage
+from streaming import iter_sentences, synthesize_sentences
+from stt import TranscriptionError, create_recognizer
+from tts_cache import SpeechCache
+from history_store import ChatHistoryStore
+from session_store import SessionStateStore, StateConflict
+from prefetch import ContinuationPrefetcher
+from admission import AdmissionGate, Busy, RateLimiter, TurnDeduplicator
+from metrics import ADMISSION_RESULTS, REQUEST_DURATION, ActiveSessions, configure_logging, new_trace_id, observe, timed, track_queue
+import speech
+
+load_dotenv()
+
+configure_logging(os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger("hr_ai_bot")
+
+# Connect to Redis through a pool of at most REDIS_POOL_SIZE connections per worker;
+# requests wait up to REDIS_POOL_TIMEOUT seconds for a free one
+redis_client = redis.asyncio.Redis(connection_pool=redis.asyncio.BlockingConnectionPool.from_url(
+    os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    max_connections=int(os.getenv("REDIS_POOL_SIZE", "32")),
+    timeout=float(os.getenv("REDIS_POOL_TIMEOUT", "2")),
+    socket_timeout=float(os.getenv("REDIS_TIMEOUT", "2")),
+    socket_connect_timeout=float(os.getenv("REDIS_TIMEOUT", "2")),
+    decode_responses=True,
+))
+
+# Idle sessions expire from Redis after SESSION_TTL seconds without a new turn.
+# Each worker keeps at most SESSION_CACHE_SIZE sessions cached locally, which
+# also lets turns and proctoring continue through a brief Redis outage.
+SESSION_TTL = int(os.getenv("SESSION_TTL", "7200"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1024"))
+history_store = ChatHistoryStore(redis_client, ttl=SESSION_TTL, local_sessions=SESSION_CACHE_SIZE)
+
+# Proctoring state is shared through Redis so any worker can serve any session
+keyboard_states = SessionStateStore(redis_client, "keyboard", ttl=SESSION_TTL, cache_size=SESSION_CACHE_SIZE)
+face_states = SessionStateStore(redis_client, "face", ttl=SESSION_TTL, cache_size=SESSION_CACHE_SIZE)
+
+# Ollama instances to spread sessions over (OLLAMA_URLS, comma-separated, or a single
+# OLLAMA_URL), each with a pooled async client; LLM_CONCURRENCY caps in-flight
+# generations per instance. A session stays on one instance unless it is down or
+# LLM_STICKY_SLACK requests busier than the least loaded one; a failed request is
+# retried on another instance up to LLM_RETRIES times (see llm_router.py).
+OLLAMA_URLS = [
+    url.strip()
+    for url in os.getenv("OLLAMA_URLS", os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")).split(",")
+    if url.strip()
+]
+# Replies to prompts without candidate input (the opening question) are cached for
+# LLM_CACHE_TTL seconds, at most LLM_CACHE_SIZE of them (0 disables the cache)
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "256"))
+llm_client = OllamaRouter(
+    [
+        OllamaClient(
+            base_url=url,
+            model=os.getenv("OLLAMA_MODEL", "llama2"),
+            timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+            max_concurrency=int(os.getenv("LLM_CONCURRENCY", "4")),
+            keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+        )
+        for url in OLLAMA_URLS
+    ],
+    retries=int(os.getenv("LLM_RETRIES", "1")),
+    cooldown=float(os.getenv("LLM_BACKEND_COOLDOWN", "10")),
+    sticky_slack=int(os.getenv("LLM_STICKY_SLACK", "4")),
+    max_sessions=SESSION_CACHE_SIZE,
+    cache=ResponseCache(LLM_CACHE_SIZE, ttl=float(os.getenv("LLM_CACHE_TTL", "3600"))) if LLM_CACHE_SIZE > 0 else None,
+)
+
+# The prompt keeps the last CONTEXT_KEEP_TURNS turns verbatim; older turns are
+# folded into a summary every CONTEXT_SUMMARIZE_EVERY turns
+conversation_context = ConversationContext(
+    history_store,
+    llm_client,
+    keep_turns=int(os.getenv("CONTEXT_KEEP_TURNS", "6")),
+    summarize_every=int(os.getenv("CONTEXT_SUMMARIZE_EVERY", "4")),
+)
+
+# Bounded pools for the blocking /talk stages. STT is mostly network/ffmpeg wait,
+# so threads are enough; pyttsx3 is not thread-safe, so TTS runs in processes.
+stt_stage = thread_stage("stt", int(os.getenv("STT_WORKERS", "4")))
+TTS_RATE = int(os.getenv("TTS_RATE", "200"))
+TTS_VOICE = os.getenv("TTS_VOICE")
+tts_stage = process_stage(
+    "tts",
+    int(os.getenv("TTS_WORKERS", "2")),
+    initializer=speech.init_tts_worker,
+    initargs=(TTS_RATE, float(os.getenv("TTS_VOLUME", "1.0")), TTS_VOICE),
+)
+tts_cache = SpeechCache(int(os.getenv("TTS_CACHE_MB", "64")) * 1024 * 1024, voice=TTS_VOICE, rate=TTS_RATE)
+
+# Speech recognition backend: "google" (network), or local "whisper" / "vosk".
+# One shared recognizer; the STT stage's threads each transcribe one utterance.
+STT_BACKEND = os.getenv("STT_BACKEND", "google")
+STT_OPTIONS = {
+    "whisper": {"model_size": os.getenv("WHISPER_MODEL", "base.en"), "num_workers": stt_stage.concurrency},
+    "vosk": {"model_path": os.getenv("VOSK_MODEL_PATH", "model")},
+}
+recognizer = create_recognizer(STT_BACKEND, **STT_OPTIONS.get(STT_BACKEND, {}))
+
+
+# Subsystems still warming up; /ready reports ready once this is empty
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))
+pending_warmup = set()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the server answers /ready (with 503) meanwhile
+    steps = warm_up_steps()
+    pending_warmup.update(steps)
+    warmup = asyncio.create_task(warm_up(steps))
+    yield
+    warmup.cancel()
+    await asyncio.gather(warmup, return_exceptions=True)
+    await llm_client.aclose()
+    stt_stage.shutdown()
+    tts_stage.shutdown()
+    if face_engine:
+        face_engine.shutdown()
+    await redis_client.aclose()
+
+
+def warm_up_steps():
+    """Load models, start worker pools and check Redis so the first candidate doesn't pay for it."""
+    steps = {
+        "redis": check_redis,
+        # Load the STT model once so the first turn doesn't pay for it
+        "stt": lambda: stt_stage.run(recognizer.load),
+        "tts": warm_up_tts,
+        # Load the model in Ollama and evaluate the system prompt
+        "llm": lambda: llm_client.warm_up([DEFAULT_SYSTEM_MESSAGE]),
+    }
+    if face_engine:
+        steps["face"] = face_engine.warm_up
+    return steps
+
 
-# Connect to Redis
-redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+async def warm_up(steps):
+    await asyncio.gather(*(warm_up_step(name, step) for name, step in steps.items()))
+    logger.info("Warm-up complete")
 
-app = FastAPI()
+
+async def warm_up_step(name, step):
+    """Run a warm-up step, retrying with backoff until it succeeds."""
+    delay = WARMUP_RETRY_INTERVAL
+    while True:
+        start = time.perf_counter()
+        try:
+            await step()
+        except Exception as e:
+            logger.warning("Warm-up of %s failed, retrying in %.0fs: %s", name, delay, e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+            continue
+        logger.info("Warmed up %s in %.2fs", name, time.perf_counter() - start)
+        pending_warmup.discard(name)
+        return
+
+
+async def check_redis():
+    await redis_client.ping()
+
+
+async def warm_up_tts():
+    """Start the TTS workers (loading their voices) and render the fixed phrases."""
+    await tts_stage.warm_up()
+    failed = await prerender_phrases()
+    if failed:
+        raise RuntimeError(f"{failed} phrase(s) could not be pre-rendered")
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Used when a session has no stored history (e.g. it expired)
+DEFAULT_SYSTEM_MESSAGE = {"role": "system", "content": "You are interviewing the user for a front-end React developer position and his name is Sid. Ask short questions relevant to a junior-level developer. Keep responses under 30 words and be strict with grading. Please also don't tell the answer to the user until and unless he completely gives up on the answer and does not know anything. Also, ask him questions again and again, don't conclude the interview."}
+
+TIMEOUT_MESSAGE = "I wasn't able to answer within the time limit."
+NOT_HEARD_MESSAGE = "Sorry, I couldn't be heard clearly."
+
+# Fixed fallback questions used when Ollama can't produce a response
+MISSING_RESPONSE_MESSAGE = "I understand you're having trouble with that question. Let's try a different topic. What can you tell me about React component lifecycle methods?"
+INVALID_RESPONSE_MESSAGE = "Let's move on to another question. How would you optimize the performance of a React application?"
+LLM_ERROR_STATUS_MESSAGE = "I see you're having difficulty. Let's switch to a different question. Can you explain the difference between props and state in React?"
+LLM_UNAVAILABLE_MESSAGE = "Let's continue the interview with a new question. What's your experience with responsive design and CSS frameworks?"
+ERROR_MESSAGE = "There was an error processing your request. Let's continue the interview with the next question."
+
+# Spoken when the server is too busy to take the turn; the candidate can answer again
+BUSY_MESSAGE = "I'm talking with a lot of candidates right now. Please give me a moment and answer again."
+
+# Turns the candidate didn't answer; their replies can be prefetched
+CONTINUATION_MESSAGES = (TIMEOUT_MESSAGE, NOT_HEARD_MESSAGE)
+
+# Rendered once at startup and pinned in the TTS cache
+PRERENDERED_PHRASES = [
+    MISSING_RESPONSE_MESSAGE,
+    INVALID_RESPONSE_MESSAGE,
+    LLM_ERROR_STATUS_MESSAGE,
+    LLM_UNAVAILABLE_MESSAGE,
+    ERROR_MESSAGE,
+    BUSY_MESSAGE,
+]
 
 origins = [
     "http://localhost:5174",
@@ -139,11 +241,110 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store KeyboardTracker instances for each session
-keyboard_trackers = {}
+# Face detection for all sessions runs in one pool of FACE_WORKERS processes.
+# With FACE_DETECTION=false OpenCV is never imported and frames aren't analysed.
+FACE_DETECTION = os.getenv("FACE_DETECTION", "true").lower() == "true"
+if FACE_DETECTION:
+    from face_engine import FaceEngine
+
+face_engine = FaceEngine(
+    workers=int(os.getenv("FACE_WORKERS", str(os.cpu_count() or 1))),
+    detector_params={
+        "min_detection_confidence": 0.5,
+        "movement_threshold": 0.1,
+        "history_size": 10,
+        # The frontend sends a frame every 2 s; smoothing over more than one frame
+        # would only report a turn held for 4 s or more
+        "smoothing_window": int(os.getenv("FACE_SMOOTHING_WINDOW", "1")),
+        # Follow the candidate's face in a downscaled ROI instead of scanning every frame in full
+        "tracking": os.getenv("FACE_TRACKING", "true").lower() == "true",
+        "working_width": int(os.getenv("FACE_WORKING_WIDTH", "320")),
+        "full_scan_interval": int(os.getenv("FACE_FULL_SCAN_INTERVAL", "10")),
+        "eye_check_interval": int(os.getenv("FACE_EYE_CHECK_INTERVAL", "5")),
+    },
+    state_store=face_states,
+) if FACE_DETECTION else None
+
+# Returned for frames when face detection is disabled
+FACE_DISABLED_RESULT = {
+    "faces_count": 0, "tilt_detected": False, "tilt_direction": None, "movement_detected": False,
+    "warnings": [], "disabled": True,
+}
+
+# With PREFETCH=true the reply to an unanswered turn is generated and synthesized
+# while the candidate is still answering (see prefetch.py)
+prefetcher = ContinuationPrefetcher(
+    generate=lambda session_id: generate_continuation(session_id),
+    synthesize=lambda text: synthesize(text),
+    history_length=history_store.length,
+    enabled=os.getenv("PREFETCH", "false").lower() == "true",
+    max_sessions=SESSION_CACHE_SIZE,
+)
+
+# Each session may send FACE_RATE_LIMIT frames and KEYBOARD_RATE_LIMIT keyboard
+# requests per second on average (bursts up to *_RATE_BURST). HTTP requests over
+# the limit get a 429; WebSocket streams are slowed down instead.
+face_limiter = RateLimiter(
+    float(os.getenv("FACE_RATE_LIMIT", "10")), float(os.getenv("FACE_RATE_BURST", "20")), SESSION_CACHE_SIZE
+)
+keyboard_limiter = RateLimiter(
+    float(os.getenv("KEYBOARD_RATE_LIMIT", "20")), float(os.getenv("KEYBOARD_RATE_BURST", "40")), SESSION_CACHE_SIZE
+)
+
+# At most TALK_CONCURRENCY turns are processed at once per worker and at most
+# TALK_QUEUE_SIZE more wait for up to TALK_QUEUE_TIMEOUT seconds; any other turn
+# is answered right away with the pre-rendered BUSY_MESSAGE (HTTP 429)
+talk_gate = AdmissionGate(
+    "talk",
+    concurrency=int(os.getenv("TALK_CONCURRENCY", "8")),
+    max_queue=int(os.getenv("TALK_QUEUE_SIZE", "16")),
+    queue_timeout=float(os.getenv("TALK_QUEUE_TIMEOUT", "10")),
+)
+
+# A /talk request repeating the session's last turn (same answer or Idempotency-Key)
+# while it runs, or up to TALK_DEDUP_WINDOW seconds after, replays that turn
+talk_turns = TurnDeduplicator(window=float(os.getenv("TALK_DEDUP_WINDOW", "10")), max_sessions=SESSION_CACHE_SIZE)
+
+# Sessions seen on this worker within SESSION_ACTIVE_WINDOW seconds, plus the
+# queue depth of every bounded stage, are exported on /metrics
+active_sessions = ActiveSessions(window=float(os.getenv("SESSION_ACTIVE_WINDOW", "300")))
+for stage in (stt_stage, tts_stage) + ((face_engine.stage,) if face_engine else ()):
+    track_queue(stage.name, lambda stage=stage: stage.waiting, lambda stage=stage: stage.running)
+track_queue("llm", lambda: llm_client.waiting, lambda: llm_client.running)
+track_queue("talk", lambda: talk_gate.waiting, lambda: talk_gate.running)
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Tag each request with a trace ID (X-Request-ID) and record its duration."""
+    trace_id = new_trace_id(request.headers.get("x-request-id"))
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_DURATION.labels(route.path if route else "unmatched").observe(time.perf_counter() - start)
+    response.headers["X-Request-ID"] = trace_id
+    return response
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once every subsystem is warm and Redis answers, 503 before."""
+    pending = sorted(pending_warmup)
+    if not pending:
+        try:
+            await check_redis()
+        except redis.RedisError:
+            pending = ["redis"]
+    if pending:
+        return JSONResponse(status_code=503, content={"status": "warming_up", "pending": pending})
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms, active sessions and queue depths."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
-# Store FaceDetector instances for each session
-face_detectors = {}
 
 @app.get("/start-session")
 async def start_session():
@@ -153,78 +354,182 @@ async def start_session():
         "role": "system",
         "content": "You are interviewing the user for a front-end React developer position and his name is Sid. Ask short questions relevant to a junior-level developer. Keep responses under 30 words and be strict with grading. Please also don't tell the answer to the user until and unless he completely gives up on the answer and does not know anything. Also, ask him questions again and again, don't conclude the interview.Please be super strict with the interview and grading"
     }]
-    redis_client.set(f"session:{session_id}", json.dumps(initial_prompt))
-    
-    # Create a keyboard tracker for this session
-    keyboard_trackers[session_id] = KeyboardTracker()
-    
-    # Create a face detector for this session
-    face_detectors[session_id] = FaceDetector(
-        min_detection_confidence=0.5,
-        movement_threshold=0.1,
-        history_size=10
-    )
+    await history_store.create(session_id, initial_prompt)
+    prefetcher.schedule(session_id)
     
     return {"session_id": session_id}
 
 
 @app.get("/chat-history")
-async def get_chat_history(session_id: str = Query(..., description="Session ID")):
-    """Fetch chat history for a given session."""
-    return load_messages(session_id)
+async def get_chat_history(
+    session_id: str = Query(..., description="Session ID"),
+    offset: int = Query(0, ge=0, description="Index of the first message to return"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of messages to return"),
+):
+    """Fetch chat history for a given session, optionally one page at a time."""
+    return await load_messages(session_id, offset, limit)
+
+@app.get("/context-metrics")
+async def get_context_metrics(session_id: str = Query(..., description="Session ID")):
+    """Per-turn prompt size and token counts for a session."""
+    return await history_store.load_metrics(session_id)
+
 
 @app.post("/talk")
 async def post_audio(
-    background_tasks: BackgroundTasks,
+    request: Request,
     file: Optional[UploadFile] = None,
     isTimeCompleted: str = Form(...), 
     session_id: str = Query(..., description="Session ID"),
+    stream: bool = Query(False, description="Stream audio sentence by sentence"),
 ):
-    """Process user speech, generate response, and store in Redis."""
+    """
+    Process user speech, generate response, and store in Redis.
+
+    With stream=true the reply is a single WAV stream that grows sentence by
+    sentence as each one is synthesized.
+
+    A retry of a turn (same answer, or same Idempotency-Key header) returns the
+    original reply instead of generating a second one. Timeouts without an
+    Idempotency-Key are never treated as retries. When the server is too
+    busy the response is a 429 with the pre-rendered BUSY_MESSAGE.
+    """
     is_time_completed = isTimeCompleted.lower() == "true"
+    active_sessions.touch(session_id)
     
     try:
-        if is_time_completed or not file:
-            user_message = "I wasn't able to answer within the time limit."
-        else:
-            result = await transcribe_audio(file)
-            user_message = result["text"]
-            
-            # If speech recognition failed, use a default message
-            if user_message == "Could not understand the audio" or user_message == "Speech recognition request failed":
-                user_message = "Sorry, I couldn't be heard clearly."
+        with timed("talk", "upload_read"):
+            audio_data = await file.read() if file and not is_time_completed else None
         
-        # Generate response from AI
-        chat_response, response_time = get_chat_response(user_message, session_id)
-        
-        # Save messages to Redis
-        save_messages(session_id, user_message, chat_response)
-        
-        # Convert response to speech
-        audio_file_path = text_to_speech(chat_response)
+        # A retried request shares the original turn instead of generating another reply
+        key = request.headers.get("idempotency-key") or audio_data
+        turn = start_turn("/talk", session_id, key, is_time_completed, audio_data, stream)
+        await turn.started()
+        if isinstance(turn.error, Busy):
+            ADMISSION_RESULTS.labels("/talk", "busy").inc()
+            return Response(content=busy_audio(), media_type="audio/mpeg", status_code=429, headers={"Retry-After": "1"})
+        if turn.error is not None and not turn.chunks:
+            raise turn.error
         
-        # Schedule file deletion after sending response
-        background_tasks.add_task(delete_audio_file, audio_file_path)
+        if stream:
+            async def audio_chunks():
+                async for pcm in wav_stream(audio async for _, audio in turn.replay()):
+                    start = time.perf_counter()
+                    yield pcm
+                    observe("talk", "stream_out", time.perf_counter() - start)
+            return StreamingResponse(audio_chunks(), media_type="audio/wav")
         
-        return StreamingResponse(open(audio_file_path, "rb"), media_type="audio/mpeg")
+        audio = b"".join([audio async for _, audio in turn.replay()])
+        return Response(content=audio, media_type="audio/mpeg")
         
-    except Exception as e:
+    except Exception:
         # Handle any errors that might occur and provide a fallback response
-        print(f"Error in post_audio: {str(e)}")
-        error_message = "There was an error processing your request. Let's continue the interview with the next question."
-        error_audio_path = text_to_speech(error_message)
-        background_tasks.add_task(delete_audio_file, error_audio_path)
-        return StreamingResponse(open(error_audio_path, "rb"), media_type="audio/mpeg")
+        logger.exception("Error in post_audio (session %s)", session_id)
+        return Response(content=await synthesize(ERROR_MESSAGE), media_type="audio/mpeg")
+
+
+@app.websocket("/ws/talk")
+async def talk_socket(websocket: WebSocket, session_id: str = Query(..., description="Session ID")):
+    """
+    Streaming variant of /talk for the frontend.
+
+    Each turn starts with either a binary message (the recorded answer) or a JSON
+    text message {"isTimeCompleted": true}. The server replies with a
+    {"type": "sentence"} text message followed by a binary audio chunk for every
+    sentence, then {"type": "done", "text": <full response>}.
+
+    A JSON turn should carry a unique "turn_id" so a resent timeout notice isn't
+    answered twice (without one it is always answered). When the server is busy
+    the reply is BUSY_MESSAGE, with "busy": true in the "done" message, and the
+    turn isn't recorded.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            # Every turn gets its own trace ID, returned with the "done" message
+            trace_id = new_trace_id()
+            start = time.perf_counter()
+            active_sessions.touch(session_id)
+            if message.get("bytes") is not None:
+                is_time_completed, audio_data, payload = False, message["bytes"], {}
+            else:
+                payload = json.loads(message.get("text") or "{}")
+                is_time_completed, audio_data = bool(payload.get("isTimeCompleted", True)), None
+            
+            try:
+                key = payload.get("turn_id") if audio_data is None else audio_data
+                turn = start_turn("/ws/talk", session_id, key, is_time_completed, audio_data, True)
+                await turn.started()
+                if isinstance(turn.error, Busy):
+                    ADMISSION_RESULTS.labels("/ws/talk", "busy").inc()
+                    await websocket.send_json({"type": "sentence", "text": BUSY_MESSAGE})
+                    await websocket.send_bytes(busy_audio())
+                    await websocket.send_json({"type": "done", "text": BUSY_MESSAGE, "busy": True, "trace_id": trace_id})
+                else:
+                    sentences = []
+                    async for sentence, audio in turn.replay():
+                        sentences.append(sentence)
+                        with timed("talk", "stream_out"):
+                            await websocket.send_json({"type": "sentence", "text": sentence})
+                            await websocket.send_bytes(audio)
+                    await websocket.send_json({"type": "done", "text": " ".join(sentences), "trace_id": trace_id})
+            except WebSocketDisconnect:
+                raise
+            except Exception:
+                logger.exception("Error in talk_socket (session %s)", session_id)
+                await websocket.send_json({"type": "sentence", "text": ERROR_MESSAGE})
+                await websocket.send_bytes(await synthesize(ERROR_MESSAGE))
+                await websocket.send_json({"type": "done", "text": ERROR_MESSAGE, "trace_id": trace_id})
+            REQUEST_DURATION.labels("/ws/talk").observe(time.perf_counter() - start)
+    except WebSocketDisconnect:
+        pass
+
 
 # New endpoint to track keyboard events
 @app.post("/track-keyboard")
 async def track_keyboard(event_data: Dict[str, Any], session_id: str = Query(..., description="Session ID")):
     """Track keyboard events and return warnings if any."""
-    if session_id not in keyboard_trackers:
-        keyboard_trackers[session_id] = KeyboardTracker()
+    limited = rate_limited(keyboard_limiter, "/track-keyboard", session_id)
+    if limited:
+        return limited
+    warnings = await track_keyboard_events(session_id, [event_data])
     
-    tracker = keyboard_trackers[session_id]
-    warnings = tracker.track(event_data)
+    if warnings:
+        return JSONResponse(content={"warnings": warnings})
+    else:
+        return JSONResponse(content={"status": "ok"})
+
+
+async def track_keyboard_events(session_id, events):
+    """Run events through the session's keyboard tracker and save its updated state."""
+    active_sessions.touch(session_id)
+
+    async def track(state):
+        with timed("keyboard", "track"):
+            tracker = KeyboardTracker.from_state(state)
+            warnings = tracker.track_batch(events)
+        return tracker.to_state(), warnings
+
+    with timed("keyboard", "state_update"):
+        try:
+            return await keyboard_states.update(session_id, track)
+        except StateConflict:
+            # Only happens when the session is flooded from several workers at once
+            logger.warning("Dropped %d keyboard events of session %s: state kept changing", len(events), session_id)
+            return []
+
+
+@app.post("/track-keyboard/batch")
+async def track_keyboard_batch(events: List[Dict[str, Any]], session_id: str = Query(..., description="Session ID")):
+    """Track an array of timestamped keyboard events and return the warnings they raised."""
+    limited = rate_limited(keyboard_limiter, "/track-keyboard/batch", session_id)
+    if limited:
+        return limited
+    warnings = await track_keyboard_events(session_id, events)
     
     if warnings:
         return JSONResponse(content={"warnings": warnings})
@@ -232,36 +537,51 @@ async def track_keyboard(event_data: Dict[str, Any], session_id: str = Query(...
         return JSONResponse(content={"status": "ok"})
 
 
+@app.websocket("/ws/keyboard")
+async def keyboard_socket(websocket: WebSocket, session_id: str = Query(..., description="Session ID")):
+    """
+    Stream batches of keyboard events.
+
+    Each text message is a JSON array of events; a {"warnings": [...]} message is
+    sent back only for batches that raised warnings.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            events = await websocket.receive_json()
+            await keyboard_limiter.wait(session_id)
+            new_trace_id()
+            warnings = await track_keyboard_events(session_id, events if isinstance(events, list) else [events])
+            if warnings:
+                await websocket.send_json({"warnings": warnings})
+    except WebSocketDisconnect:
+        pass
+
+
 @app.post("/process-face")
 async def process_face(frame_data: Dict[str, Any], session_id: str = Query(..., description="Session ID")):
     """Process webcam frame and detect faces and head movements."""
-    # Only process if session exists
-    if session_id not in face_detectors:
-        face_detectors[session_id] = FaceDetector(
-            min_detection_confidence=0.5,
-            movement_threshold=0.1,
-            history_size=10
-        )
-    
-    detector = face_detectors[session_id]
-    
     # Use a lightweight response when system is busy
     if frame_data.get("lightweight_check", False):
         return JSONResponse(content={"status": "ok", "lightweight": True})
     
+    limited = rate_limited(face_limiter, "/process-face", session_id)
+    if limited:
+        return limited
+    
     # Process the base64 image
+    active_sessions.touch(session_id)
     try:
         # Decode the base64 image
-        image_bytes = base64.b64decode(frame_data.get("image", ""))
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        with timed("face", "b64_decode"):
+            image_bytes = base64.b64decode(frame_data.get("image", ""))
         
-        # Process the frame with the face detector
-        results = detector.process_frame(frame)
+        # Process the frame in the shared face detection engine
+        results = await process_face_frame(session_id, image_bytes)
         
         return JSONResponse(content=results)
     except Exception as e:
-        print(f"Error in process_face: {str(e)}")
+        logger.exception("Error in process_face (session %s)", session_id)
         return JSONResponse(content={
             "faces_count": 0, 
             "movement_detected": False, 
@@ -269,134 +589,393 @@ async def process_face(frame_data: Dict[str, Any], session_id: str = Query(...,
         })
 
 
-def delete_audio_file(file_path: str):
-    """Delete the generated audio file after playing."""
+@app.websocket("/ws/face")
+async def face_socket(websocket: WebSocket, session_id: str = Query(..., description="Session ID")):
+    """
+    Stream webcam frames as binary JPEG messages.
+
+    Only the newest frame is kept while the detector is busy (or the session is
+    over its frame rate limit); older ones are dropped instead of queueing. Results are pushed back only when they differ
+    from the last result sent.
+    """
+    await websocket.accept()
+    latest = {"frame": None}
+    frame_ready = asyncio.Event()
+
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                latest["frame"] = message["bytes"]
+                frame_ready.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    last_sent = None
     try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            print(f"Deleted audio file: {file_path}")
-    except Exception as e:
-        print(f"Error deleting file {file_path}: {e}")
+        while True:
+            waiter = asyncio.create_task(frame_ready.wait())
+            done, _ = await asyncio.wait({receiver, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                waiter.cancel()
+                break
+            # Over the rate limit, wait (newer frames replace this one meanwhile)
+            await face_limiter.wait(session_id)
+            frame_ready.clear()
+            image_bytes, latest["frame"] = latest["frame"], None
+            new_trace_id()
+            active_sessions.touch(session_id)
+            
+            try:
+                results = await process_face_frame(session_id, image_bytes)
+            except Exception as e:
+                logger.exception("Error in face_socket (session %s)", session_id)
+                results = {
+                    "faces_count": 0,
+                    "movement_detected": False,
+                    "warnings": [f"Error processing frame: {str(e)}"]
+                }
+            
+            if results != last_sent:
+                await websocket.send_json(results)
+                last_sent = results
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        await asyncio.gather(receiver, return_exceptions=True)
+
+
+def rate_limited(limiter, endpoint, session_id):
+    """Return a 429 response if the session is over its rate limit for endpoint, else None."""
+    retry_after = limiter.acquire(session_id)
+    if not retry_after:
+        return None
+    ADMISSION_RESULTS.labels(endpoint, "rate_limited").inc()
+    return JSONResponse(
+        status_code=429,
+        content={"status": "rate_limited", "retry_after": round(retry_after, 3)},
+        headers={"Retry-After": str(math.ceil(retry_after))},
+    )
+
+
+async def process_face_frame(session_id, image_bytes):
+    """Run a frame through the face engine and record the worker's per-stage timings."""
+    if not face_engine:
+        return dict(FACE_DISABLED_RESULT)
+    timings = {}
+    start = time.perf_counter()
+    results = await face_engine.process(session_id, image_bytes, timings)
+    # Whatever the worker didn't spend decoding or detecting was spent queued / in IPC
+    observe("face", "queue", max(0.0, time.perf_counter() - start - sum(timings.values())))
+    for stage, seconds in timings.items():
+        observe("face", stage, seconds)
+    return results
 
 
 @app.get("/clear")
 async def clear_history(session_id: str = Query(..., description="Session ID")):
     """Clear chat history for a specific session."""
-    redis_client.delete(f"session:{session_id}")
-    
-    # Clear keyboard tracker for the session
-    if session_id in keyboard_trackers:
-        del keyboard_trackers[session_id]
-    
-    # Clear face detector for the session
-    if session_id in face_detectors:
-        del face_detectors[session_id]
+    # Chat history, keyboard tracker state and face tracking state go in one DEL
+    await history_store.clear(session_id, keyboard_states.key(session_id), face_states.key(session_id))
+    keyboard_states.forget(session_id)
+    face_states.forget(session_id)
+    active_sessions.discard(session_id)
+    prefetcher.discard(session_id)
+    llm_client.discard(session_id)
+    talk_turns.discard(session_id)
+    face_limiter.discard(session_id)
+    keyboard_limiter.discard(session_id)
         
     return {"message": f"Chat history for session {session_id} has been cleared"}
 
 
-async def transcribe_audio(file: UploadFile):
-    """Convert speech to text using speech recognition."""
-    audio_path = f"temp_audio_{uuid.uuid4().hex}.wav"
+async def transcribe_audio(data: bytes):
+    """Convert speech to text using the configured speech recognition backend."""
+    with timed("talk", "decode"):
+        pcm = await stt_stage.run(speech.decode_to_pcm, data)
     try:
-        with open(audio_path, 'wb') as buffer:
-            buffer.write(await file.read())
+        with timed("talk", "stt"):
+            transcript = await stt_stage.run(recognizer.transcribe, pcm, speech.SAMPLE_RATE)
+    except TranscriptionError as e:
+        logger.warning("Error in transcribe_audio: %s", e)
+        return {"text": "Speech recognition request failed"}
+    
+    if not transcript:
+        return {"text": "Could not understand the audio"}
+    return {"text": transcript}
 
-        audio = AudioSegment.from_file(audio_path)
-        audio.export(audio_path, format="wav")
 
-        recognizer = sr.Recognizer()
-        with sr.AudioFile(audio_path) as source:
-            audio_data = recognizer.record(source)
+async def resolve_user_message(is_time_completed: bool, audio_data: Optional[bytes]) -> str:
+    """Turn the candidate's answer (or the lack of one) into the user message for this turn."""
+    if is_time_completed or not audio_data:
+        return TIMEOUT_MESSAGE
+    
+    result = await transcribe_audio(audio_data)
+    user_message = result["text"]
+    
+    # If speech recognition failed, use a default message
+    if user_message == "Could not understand the audio" or user_message == "Speech recognition request failed":
+        user_message = NOT_HEARD_MESSAGE
+    return user_message
 
-        try:
-            transcript = recognizer.recognize_google(audio_data)
-            return {"text": transcript}
-        except sr.UnknownValueError:
-            return {"text": "Could not understand the audio"}
-        except sr.RequestError:
-            return {"text": "Speech recognition request failed"}
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
 
-def get_chat_response(user_message, session_id):
-    """Generate AI response based on session chat history."""
-    messages = load_messages(session_id) 
+async def build_chat_context(user_message, session_id):
+    """Build the bounded list of chat messages sent to Ollama for this turn."""
+    new_messages = [{"role": "user", "content": user_message}]
     
     # If user couldn't answer, add a prompt to continue the interview
-    if user_message in ["I wasn't able to answer within the time limit.", "Sorry, I couldn't be heard clearly."]:
-        messages.append({"role": "user", "content": user_message})
+    if user_message in [TIMEOUT_MESSAGE, NOT_HEARD_MESSAGE]:
         # Add a system message to prompt the AI to continue with a new question
-        messages.append({
+        new_messages.append({
             "role": "system", 
             "content": "The candidate couldn't answer in time. Continue the interview with a new question or follow-up. Be strict but encouraging."
         })
-    else:
-        messages.append({"role": "user", "content": user_message})
 
-    conversation_prompt = "\n".join([f"{msg['role'].capitalize()}: {msg['content']}" for msg in messages])
+    with timed("talk", "redis_load"):
+        context = await conversation_context.build(session_id, DEFAULT_SYSTEM_MESSAGE, new_messages)
+    
+    # Without an answer on the first turn the prompt is the same for every session,
+    # so the reply (the opening question) can be served from the LLM response cache
+    context["cacheable"] = user_message in CONTINUATION_MESSAGES and context["history_length"] <= 1
+    return context
+
+
+def start_turn(endpoint, session_id, key, is_time_completed, audio_data, stream):
+    """
+    Start a /talk turn in the background, or return the running/recent turn it repeats.
+
+    key identifies the turn (the answer's audio, or the client's idempotency key /
+    turn_id). Without one, e.g. a timeout notice from an older client, the turn
+    can't be told apart from the next timeout and is never deduplicated.
+    """
+    fingerprint = talk_turns.fingerprint(stream, is_time_completed, key) if key else None
+    turn, duplicate = talk_turns.run(
+        session_id, fingerprint, lambda: run_turn(session_id, is_time_completed, audio_data, stream)
+    )
+    if duplicate:
+        ADMISSION_RESULTS.labels(endpoint, "duplicate").inc()
+    return turn
+
 
-    url = "http://127.0.0.1:11434/api/generate"  
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "model": "llama2",
-        "prompt": conversation_prompt,
-        "stream": False
-    }
+async def run_turn(session_id, is_time_completed, audio_data, stream):
+    """
+    Answer one turn under the talk gate, yielding (sentence, audio) pairs.
+
+    Raises Busy before yielding anything if the gate turns it away. A streamed
+    turn yields every sentence as it is synthesized, otherwise the whole reply
+    comes as one pair.
+    """
+    async with talk_gate.admit():
+        user_message = await resolve_user_message(is_time_completed, audio_data)
+        
+        if stream:
+            async for sentence, audio in stream_chat_audio(user_message, session_id):
+                yield sentence, audio
+            return
+        
+        # Generate response from AI
+        chat_response, response_time, context, stats = await get_chat_response(user_message, session_id)
+        
+        # Save messages to Redis
+        with timed("talk", "redis_save"):
+            await save_messages(session_id, user_message, chat_response)
+            await conversation_context.complete_turn(session_id, context, stats)
+        prefetcher.schedule(session_id)
+        
+        # Convert response to speech
+        with timed("talk", "tts"):
+            audio = await synthesize(chat_response)
+        yield chat_response, audio
+
+
+def busy_audio() -> bytes:
+    """The pre-rendered BUSY_MESSAGE (empty until warm-up has rendered it, never synthesized under load)."""
+    return tts_cache.get(BUSY_MESSAGE) or b""
+
+
+async def take_prefetched(user_message, session_id):
+    """Return the prefetched reply for an unanswered turn, dropping it when a real answer arrives."""
+    if user_message not in CONTINUATION_MESSAGES:
+        prefetcher.discard(session_id)
+        return None
+    with timed("talk", "prefetch_wait"):
+        return await prefetcher.take(session_id)
+
+
+async def get_chat_response(user_message, session_id):
+    """Generate AI response based on session chat history."""
+    prefetched = await take_prefetched(user_message, session_id)
+    if prefetched:
+        chat_response, context, stats = prefetched
+        return chat_response, 0.0, context, stats
+
+    context = await build_chat_context(user_message, session_id)
+    parsed_response, response_time, stats = await request_chat_response(context, session_id)
+    observe("talk", "llm", response_time)
+    return parsed_response, response_time, context, stats
 
+
+async def generate_continuation(session_id):
+    """Generate the reply to a timed-out turn for the prefetcher (None if Ollama failed or is busy)."""
+    try:
+        # Speculative work never queues for a slot candidates are waiting for
+        async with talk_gate.admit(wait=False):
+            context = await build_chat_context(TIMEOUT_MESSAGE, session_id)
+            response, _, stats = await request_chat_response(context, session_id)
+    except Busy:
+        return None
+    if response in (MISSING_RESPONSE_MESSAGE, INVALID_RESPONSE_MESSAGE, LLM_ERROR_STATUS_MESSAGE, LLM_UNAVAILABLE_MESSAGE):
+        return None
+    return response, context, stats
+
+
+async def request_chat_response(context, session_id=None):
+    """Send the context to Ollama; returns (response text or fallback message, response time, token stats)."""
+    stats = None
     start_time = time.time()
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        response = await llm_client.chat(context["messages"], session_id=session_id, cacheable=context["cacheable"])
         response_time = time.time() - start_time
 
         if response.status_code == 200:
             try:
                 gpt_response = response.json()
-                if "response" in gpt_response:
-                    parsed_response = gpt_response["response"]
+                stats = token_stats(gpt_response)
+                if gpt_response.get("cached"):
+                    stats["cached"] = True
+                if "message" in gpt_response:
+                    parsed_response = gpt_response["message"]["content"]
                 else:
-                    parsed_response = "I understand you're having trouble with that question. Let's try a different topic. What can you tell me about React component lifecycle methods?"
+                    parsed_response = MISSING_RESPONSE_MESSAGE
             except (json.JSONDecodeError, KeyError):
-                parsed_response = "Let's move on to another question. How would you optimize the performance of a React application?"
+                parsed_response = INVALID_RESPONSE_MESSAGE
         else:
-            parsed_response = "I see you're having difficulty. Let's switch to a different question. Can you explain the difference between props and state in React?"
-    except requests.exceptions.RequestException:
-        parsed_response = "Let's continue the interview with a new question. What's your experience with responsive design and CSS frameworks?"
+            parsed_response = LLM_ERROR_STATUS_MESSAGE
+    except httpx.HTTPError:
+        parsed_response = LLM_UNAVAILABLE_MESSAGE
         response_time = time.time() - start_time
     
-    return parsed_response, response_time
-
-
-def load_messages(session_id):
-    """Retrieve chat history for a given session from Redis."""
-    chat_history = redis_client.get(f"session:{session_id}")
-    if chat_history:
-        return json.loads(chat_history)  
-    else:
-        return [
-            {"role": "system", "content": "You are interviewing the user for a front-end React developer position and his name is Sid. Ask short questions relevant to a junior-level developer. Keep responses under 30 words and be strict with grading. Please also don't tell the answer to the user until and unless he completely gives up on the answer and does not know anything. Also, ask him questions again and again, don't conclude the interview."}
-        ]
-
+    return parsed_response, response_time, stats
+
+
+async def stream_chat_audio(user_message, session_id):
+    """
+    Stream the AI response as (sentence, audio) pairs while it is being generated.
+
+    The full response is saved to Redis once generation finishes. If Ollama can't be
+    reached before the first sentence, the usual fallback question is spoken instead.
+    A prefetched reply, like the fallback question, is sent as a single chunk (the
+    fallback's pre-rendered audio is only found in the TTS cache as a whole).
+    """
+    prefetched = await take_prefetched(user_message, session_id)
+    if prefetched:
+        chat_response, context, stats = prefetched
+        with timed("talk", "tts"):
+            audio = await synthesize(chat_response)
+        yield chat_response, audio
+        with timed("talk", "redis_save"):
+            await save_messages(session_id, user_message, chat_response)
+            await conversation_context.complete_turn(session_id, context, stats)
+        prefetcher.schedule(session_id)
+        return
+
+    context = await build_chat_context(user_message, session_id)
+    stats = {}
+    sentences = []
+
+    async def tokens():
+        start = time.perf_counter()
+        first_token = True
+        try:
+            async for token in llm_client.stream_chat(
+                context["messages"], stats, session_id=session_id, cacheable=context["cacheable"]
+            ):
+                if first_token:
+                    observe("talk", "llm_first_token", time.perf_counter() - start)
+                    first_token = False
+                yield token
+        except httpx.HTTPError as e:
+            logger.warning("Error streaming from Ollama: %s", e)
+        observe("talk", "llm", time.perf_counter() - start)
+
+    async def timed_synthesize(text):
+        with timed("talk", "tts"):
+            return await synthesize(text)
+
+    async for sentence, audio in synthesize_sentences(iter_sentences(tokens()), timed_synthesize):
+        sentences.append(sentence)
+        yield sentence, audio
+    if not sentences:
+        # Not split into sentences, so the pre-rendered audio is used
+        sentences.append(LLM_UNAVAILABLE_MESSAGE)
+        yield LLM_UNAVAILABLE_MESSAGE, await timed_synthesize(LLM_UNAVAILABLE_MESSAGE)
+
+    with timed("talk", "redis_save"):
+        await save_messages(session_id, user_message, " ".join(sentences))
+        await conversation_context.complete_turn(session_id, context, stats)
+    prefetcher.schedule(session_id)
+
+
+async def wav_stream(chunks):
+    """
+    Join per-sentence audio files into a single streamed WAV.
+
+    Every sentence is synthesized as a complete file, and concatenated files
+    don't play as one stream. This yields one header (at the first sentence's
+    sample rate) and then only each sentence's frames; sentences in another
+    format are decoded to match.
+    """
+    sample_rate = None
+    async for audio in chunks:
+        if not audio:
+            continue
+        try:
+            rate, frames = speech.read_wav(audio)
+        except ValueError:
+            rate, frames = None, None
+        if sample_rate is None:
+            sample_rate = rate or speech.SAMPLE_RATE
+            yield speech.wav_stream_header(sample_rate)
+        if rate != sample_rate:
+            frames = await stt_stage.run(speech.decode_to_pcm, audio, sample_rate)
+        yield frames
+
+
+async def synthesize(text, pin=False) -> bytes:
+    """Return audio for text from the TTS cache, synthesizing it in the TTS stage on a miss."""
+    return await tts_cache.get_or_synthesize(
+        text, lambda phrase: tts_stage.run(speech.text_to_speech, phrase), pin=pin
+    )
 
-def save_messages(session_id, user_message, gpt_response):
-    """Save conversation to Redis under the session ID."""
-    messages = load_messages(session_id)  
-    messages.append({"role": "user", "content": user_message}) 
-    messages.append({"role": "assistant", "content": gpt_response})  
 
-    redis_client.set(f"session:{session_id}", json.dumps(messages))  # Save session conversation in Redis
+async def prerender_phrases():
+    """Render the fixed fallback/error phrases so those paths never wait for TTS; returns the number that failed."""
+    results = await asyncio.gather(
+        *(synthesize(phrase, pin=True) for phrase in PRERENDERED_PHRASES),
+        return_exceptions=True,
+    )
+    for phrase, result in zip(PRERENDERED_PHRASES, results):
+        if isinstance(result, Exception):
+            logger.error("Error pre-rendering phrase %r: %s", phrase, result)
+    return sum(isinstance(result, Exception) for result in results)
 
 
-def text_to_speech(text):
-    """Convert AI response to speech and save as an audio file."""
-    engine = pyttsx3.init()
-    engine.setProperty('rate', 200)
-    engine.setProperty('volume', 1.0)
+async def load_messages(session_id, offset=0, limit=None):
+    """Retrieve chat history for a given session from Redis."""
+    chat_history = await history_store.load(session_id, offset, limit)
+    if chat_history or offset > 0:
+        return chat_history
+    else:
+        return [DEFAULT_SYSTEM_MESSAGE]
 
-    audio_path = f"response_{uuid.uuid4().hex}.mp3"  
-    engine.save_to_file(text, audio_path)
-    engine.runAndWait()
 
-    return audio_path
\ No newline at end of file
+async def save_messages(session_id, user_message, gpt_response):
+    """Append the turn to the session conversation in Redis (restarting an expired one from the system prompt)."""
+    await history_store.append(
+        session_id,
+        {"role": "user", "content": user_message},
+        {"role": "assistant", "content": gpt_response},
+        seed=[DEFAULT_SYSTEM_MESSAGE],
+    )
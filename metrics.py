@@ -0,0 +1,133 @@
+import contextvars
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Trace ID of the request being handled (set by the tracing middleware / WebSocket handlers)
+trace_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("trace_id", default="-")
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_DURATION = Histogram(
+    "hrbot_request_duration_seconds",
+    "End-to-end duration of HTTP requests and WebSocket messages",
+    ["endpoint"],
+    buckets=STAGE_BUCKETS,
+)
+STAGE_DURATION = Histogram(
+    "hrbot_stage_duration_seconds",
+    "Duration of individual pipeline stages",
+    ["endpoint", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+ACTIVE_SESSIONS = Gauge(
+    "hrbot_active_sessions",
+    "Sessions with activity on this worker in the last few minutes",
+)
+QUEUE_DEPTH = Gauge(
+    "hrbot_queue_depth",
+    "Requests waiting for a slot in a bounded stage",
+    ["stage"],
+)
+IN_FLIGHT = Gauge(
+    "hrbot_in_flight",
+    "Requests currently being processed by a bounded stage",
+    ["stage"],
+)
+
+PREFETCH_RESULTS = Counter(
+    "hrbot_prefetch_total",
+    "Timeout / not-heard turns by prefetch outcome (hit, miss, stale, failed)",
+    ["result"],
+)
+LLM_BACKEND_REQUESTS = Counter(
+    "hrbot_llm_backend_requests_total",
+    "Requests to each Ollama backend by outcome (ok, error)",
+    ["backend", "result"],
+)
+LLM_CACHE_RESULTS = Counter(
+    "hrbot_llm_cache_total",
+    "Cacheable LLM requests by outcome (hit, miss, shared with a concurrent miss)",
+    ["result"],
+)
+ADMISSION_RESULTS = Counter(
+    "hrbot_admission_total",
+    "Requests turned away (rate_limited, busy) or replayed (duplicate) by admission control",
+    ["endpoint", "result"],
+)
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds the current trace ID to every log record as %(trace_id)s."""
+
+    def filter(self, record):
+        record.trace_id = trace_id_var.get()
+        return True
+
+
+def configure_logging(level: str = "INFO"):
+    handler = logging.StreamHandler()
+    handler.addFilter(TraceIdFilter())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def new_trace_id(incoming: Optional[str] = None) -> str:
+    """Use the caller's trace ID if it sent one, otherwise start a new trace."""
+    trace_id = incoming or uuid.uuid4().hex
+    trace_id_var.set(trace_id)
+    return trace_id
+
+
+def observe(endpoint: str, stage: str, seconds: float, timings: Optional[Dict[str, float]] = None):
+    STAGE_DURATION.labels(endpoint, stage).observe(seconds)
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(endpoint: str, stage: str, timings: Optional[Dict[str, float]] = None):
+    """Time the enclosed block as one stage of endpoint (optionally also into timings)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(endpoint, stage, time.perf_counter() - start, timings)
+
+
+def track_queue(stage: str, waiting: Callable[[], float], running: Callable[[], float]):
+    """Export the queue depth and in-flight count of a bounded stage."""
+    QUEUE_DEPTH.labels(stage).set_function(waiting)
+    IN_FLIGHT.labels(stage).set_function(running)
+
+
+class ActiveSessions:
+    """Bounded record of when each session was last seen, exported as a gauge."""
+
+    def __init__(self, window: float = 300, max_sessions: int = 100000):
+        self.window = window
+        self.max_sessions = max_sessions
+        self.last_seen: "OrderedDict[str, float]" = OrderedDict()
+        ACTIVE_SESSIONS.set_function(self.count)
+
+    def touch(self, session_id: str):
+        self.last_seen[session_id] = time.monotonic()
+        self.last_seen.move_to_end(session_id)
+        while len(self.last_seen) > self.max_sessions:
+            self.last_seen.popitem(last=False)
+
+    def discard(self, session_id: str):
+        self.last_seen.pop(session_id, None)
+
+    def count(self) -> int:
+        cutoff = time.monotonic() - self.window
+        while self.last_seen and next(iter(self.last_seen.values())) < cutoff:
+            self.last_seen.popitem(last=False)
+        return len(self.last_seen)
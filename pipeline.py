@@ -0,0 +1,73 @@
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class Stage:
+    """
+    A bounded stage of the /talk pipeline that runs blocking work off the event loop.
+
+    Each stage owns its executor and a semaphore, so a burst of requests for one
+    stage (e.g. TTS) queues up here instead of starving the other endpoints.
+    """
+
+    def __init__(self, name: str, executor: Executor, concurrency: int):
+        self.name = name
+        self.executor = executor
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # Queue depth and in-flight count, exported as gauges (see metrics.track_queue)
+        self.waiting = 0
+        self.running = 0
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in the stage executor, respecting the concurrency limit."""
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+
+    async def warm_up(self, fn: Callable[[], Any] = None):
+        """
+        Start every worker now instead of on first use.
+
+        One task per worker is submitted at once, so a process pool spawns all of
+        its workers (running their initializers); fn, if given, runs in each.
+        """
+        await asyncio.gather(*(self.run(fn or _noop) for _ in range(self.concurrency)))
+
+    def shutdown(self, wait: bool = False):
+        """Cancel queued work and stop the workers; with wait, block until they have exited."""
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _noop():
+    pass
+
+
+def thread_stage(name: str, workers: int) -> Stage:
+    """Create a stage backed by a thread pool (for I/O-bound or GIL-releasing work)."""
+    return Stage(name, ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name), workers)
+
+
+def process_stage(name: str, workers: int, initializer: Optional[Callable[..., Any]] = None, initargs: tuple = ()) -> Stage:
+    """
+    Create a stage backed by a process pool.
+
+    Workers are spawned rather than forked so they don't inherit the event loop,
+    Redis connections or executor threads of the API process. They are long-lived;
+    initializer runs once in each worker to set up per-process state.
+    """
+    context = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=initializer, initargs=initargs)
+    return Stage(name, executor, workers)
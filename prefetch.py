@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from metrics import PREFETCH_RESULTS
+
+logger = logging.getLogger(__name__)
+
+# (response text, context it was generated from, token stats)
+Continuation = Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]
+
+
+class ContinuationPrefetcher:
+    """
+    Speculatively prepares the reply for a turn the candidate doesn't answer.
+
+    After each assistant turn, the reply the interviewer would give if the answer
+    times out (or can't be heard) is generated and synthesized in the background
+    while the candidate is still thinking or speaking. The rendered audio lands in
+    the TTS cache; the text and context wait in a per-session slot until the next
+    turn takes them. A real answer cancels the slot, and so does a history that
+    changed since the prefetch started (e.g. a turn handled by another worker).
+
+    generate(session_id) returns a Continuation, or None when the LLM only
+    produced a fallback message (which isn't worth keeping).
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str], Awaitable[Optional[Continuation]]],
+        synthesize: Callable[[str], Awaitable[bytes]],
+        history_length: Callable[[str], Awaitable[int]],
+        enabled: bool = True,
+        max_sessions: int = 1024,
+    ):
+        self.generate = generate
+        self.synthesize = synthesize
+        self.history_length = history_length
+        self.enabled = enabled
+        self.max_sessions = max_sessions
+        self.slots: "OrderedDict[str, asyncio.Task]" = OrderedDict()
+
+    def schedule(self, session_id: str):
+        """Start prefetching the session's next continuation (replacing any older one)."""
+        if not self.enabled:
+            return
+        self.discard(session_id)
+        self.slots[session_id] = asyncio.create_task(self._prefetch(session_id))
+        while len(self.slots) > self.max_sessions:
+            _, task = self.slots.popitem(last=False)
+            task.cancel()
+
+    async def _prefetch(self, session_id: str) -> Optional[Continuation]:
+        try:
+            continuation = await self.generate(session_id)
+            if continuation is not None:
+                await self.synthesize(continuation[0])
+            return continuation
+        except Exception:
+            logger.exception("Error prefetching continuation for session %s", session_id)
+            return None
+
+    async def take(self, session_id: str) -> Optional[Continuation]:
+        """
+        Claim the session's prefetched continuation, waiting for it if it's still running.
+
+        Returns None if there is none, it failed, or the history has moved on since.
+        """
+        task = self.slots.pop(session_id, None)
+        if task is None:
+            if self.enabled:
+                PREFETCH_RESULTS.labels("miss").inc()
+            return None
+
+        continuation = await task
+        if continuation is None:
+            PREFETCH_RESULTS.labels("failed").inc()
+            return None
+        if continuation[1]["history_length"] != await self.history_length(session_id):
+            PREFETCH_RESULTS.labels("stale").inc()
+            return None
+
+        PREFETCH_RESULTS.labels("hit").inc()
+        return continuation
+
+    def discard(self, session_id: str):
+        """Drop the session's prefetch, cancelling it if it is still being generated."""
+        task = self.slots.pop(session_id, None)
+        if task is not None:
+            task.cancel()
@@ -0,0 +1,246 @@
+"""
+Re-analyse recorded interviews offline, without going through the HTTP API.
+
+Every recording (a video with an audio track, or audio only) is streamed from
+disk: frames are sampled at --fps and run through FaceDetector with the given
+thresholds, and the audio is decoded in --chunk-seconds pieces and transcribed.
+The result is one JSON timeline per interview with the face warnings (at the
+recording's timestamps) and the transcript segments, plus a summary.
+
+Recordings are processed in parallel by a pool of worker processes, each of
+which loads the cascades and the STT model once. Existing timelines are skipped
+(unless --overwrite), so an interrupted run over a large archive can be resumed.
+
+Usage:
+    python reanalyze.py archive/ --output timelines/ --tilt-threshold 0.08
+    python reanalyze.py interview.webm --stt-backend whisper --workers 4
+    python reanalyze.py archive/ --no-audio --fps 5 --movement-threshold 0.2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import speech
+from face_detector import FaceDetector, FaceTrackingState
+from stt import SpeechRecognizer, TranscriptionError, create_recognizer
+
+RECORDING_EXTENSIONS = (".webm", ".mp4", ".mkv", ".mov", ".avi", ".ogg", ".wav", ".m4a", ".mp3")
+
+# The detector and recognizer owned by this worker process (see _init_worker)
+_detector: Optional[FaceDetector] = None
+_recognizer: Optional[SpeechRecognizer] = None
+
+
+def _init_worker(detector_params: Optional[Dict[str, Any]], stt_backend: Optional[str], stt_options: Dict[str, Any]):
+    """Process-pool initializer: load the cascades and STT model once per worker."""
+    global _detector, _recognizer
+    import cv2
+
+    # Parallelism comes from the pool; keep OpenCV from oversubscribing the cores
+    cv2.setNumThreads(1)
+    _detector = FaceDetector(**detector_params) if detector_params is not None else None
+    if stt_backend:
+        _recognizer = create_recognizer(stt_backend, **stt_options)
+        _recognizer.load()
+
+
+def iter_sampled_frames(path: str, fps: float) -> Iterator[Tuple[float, Any]]:
+    """Yield (seconds, frame) from a video, about fps frames per second of recording."""
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    native_fps = capture.get(cv2.CAP_PROP_FPS) or 0
+    index, next_sample = -1, 0.0
+    try:
+        # grab() skips frames without decoding them; only sampled frames are retrieved
+        while capture.grab():
+            index += 1
+            seconds = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if seconds <= 0 and index > 0 and native_fps > 0:
+                seconds = index / native_fps
+            if seconds + 1e-6 < next_sample:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                continue
+            next_sample = seconds + 1 / fps
+            yield seconds, frame
+    finally:
+        capture.release()
+
+
+def analyze_video(path: str, fps: float) -> Tuple[List[Dict[str, Any]], int]:
+    """Run the session's frames through the detector; returns (warning events, frames analysed)."""
+    state = FaceTrackingState()
+    events, frames = [], 0
+    for seconds, frame in iter_sampled_frames(path, fps):
+        results = _detector.process_frame(frame, state, timestamp=seconds)
+        frames += 1
+        if results["warnings"]:
+            events.append({
+                "time": round(seconds, 2),
+                "type": "face",
+                "faces_count": results["faces_count"],
+                "tilt_direction": results["tilt_direction"],
+                "warnings": results["warnings"],
+            })
+    return events, frames
+
+
+def analyze_audio(path: str, chunk_seconds: float) -> Tuple[List[Dict[str, Any]], float]:
+    """Transcribe the audio track chunk by chunk; returns (transcript events, audio duration)."""
+    events, offset = [], 0.0
+    bytes_per_second = speech.SAMPLE_RATE * speech.SAMPLE_WIDTH
+
+    for pcm in speech.iter_pcm_chunks(path, chunk_seconds):
+        start, end = offset, offset + len(pcm) / bytes_per_second
+        offset = end
+        try:
+            text = _recognizer.transcribe(pcm, speech.SAMPLE_RATE)
+        except TranscriptionError as e:
+            # One bad chunk doesn't fail the rest of the recording
+            events.append({"time": round(start, 2), "end": round(end, 2), "type": "transcript_error", "error": str(e)})
+            continue
+        if text:
+            events.append({"time": round(start, 2), "end": round(end, 2), "type": "transcript", "text": text})
+    return events, offset
+
+
+def warning_type(message: str) -> str:
+    """Group warnings like "Multiple faces detected (3 faces)" under one name."""
+    return message.split(" (")[0]
+
+
+def analyze_recording(path: str, output_path: str, fps: float, chunk_seconds: float, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Analyse one recording in a worker process and write its timeline; returns the summary."""
+    start = time.perf_counter()
+    events, errors = [], []
+    frames, audio_seconds = 0, 0.0
+
+    if _detector is not None:
+        try:
+            video_events, frames = analyze_video(path, fps)
+            events.extend(video_events)
+        except Exception as e:
+            errors.append(f"video: {e}")
+    if _recognizer is not None:
+        try:
+            audio_events, audio_seconds = analyze_audio(path, chunk_seconds)
+            events.extend(audio_events)
+        except (ValueError, OSError) as e:
+            errors.append(f"audio: {e}")
+
+    events.sort(key=lambda event: event["time"])
+    warnings = Counter(warning_type(message) for event in events if event["type"] == "face" for message in event["warnings"])
+    summary = {
+        "recording": path,
+        "frames_analyzed": frames,
+        "audio_seconds": round(audio_seconds, 2),
+        "warning_counts": dict(warnings),
+        "transcript_segments": sum(event["type"] == "transcript" for event in events),
+        "errors": errors,
+        "processing_seconds": round(time.perf_counter() - start, 2),
+    }
+
+    # Written to a temporary name first so an interrupted run never leaves a partial timeline
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path + ".tmp", "w") as f:
+        json.dump({"summary": summary, "params": params, "events": events}, f, indent=1)
+    os.replace(output_path + ".tmp", output_path)
+    return summary
+
+
+def find_recordings(inputs: List[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (recording path, path relative to its input root) for files and directory trees."""
+    for root in inputs:
+        if os.path.isfile(root):
+            yield root, os.path.basename(root)
+            continue
+        for directory, _, names in os.walk(root):
+            for name in sorted(names):
+                if name.lower().endswith(RECORDING_EXTENSIONS):
+                    path = os.path.join(directory, name)
+                    yield path, os.path.relpath(path, root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="recordings or directories of recordings")
+    parser.add_argument("--output", default="timelines", help="directory for the <recording>.json timelines")
+    parser.add_argument("--overwrite", action="store_true", help="re-analyse recordings that already have a timeline")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--fps", type=float, default=2.0, help="frames analysed per second of video")
+    parser.add_argument("--chunk-seconds", type=float, default=30.0, help="length of the transcribed audio chunks")
+    parser.add_argument("--no-video", action="store_true", help="skip face analysis")
+    parser.add_argument("--no-audio", action="store_true", help="skip transcription")
+    parser.add_argument("--stt-backend", default=os.getenv("STT_BACKEND", "google"), help="google, whisper or vosk")
+    parser.add_argument("--whisper-model", default=os.getenv("WHISPER_MODEL", "base.en"))
+    parser.add_argument("--vosk-model-path", default=os.getenv("VOSK_MODEL_PATH", "model"))
+    parser.add_argument("--min-detection-confidence", type=float, default=0.5)
+    parser.add_argument("--movement-threshold", type=float, default=0.1)
+    parser.add_argument("--tilt-threshold", type=float, default=0.06)
+    parser.add_argument("--history-size", type=int, default=10)
+    parser.add_argument("--tracking", action="store_true", help="use ROI tracking like the live service")
+    parser.add_argument("--working-width", type=int, default=320, help="downscale width in tracking mode")
+    args = parser.parse_args()
+
+    detector_params = None if args.no_video else {
+        "min_detection_confidence": args.min_detection_confidence,
+        "movement_threshold": args.movement_threshold,
+        "tilt_threshold": args.tilt_threshold,
+        "history_size": args.history_size,
+        "tracking": args.tracking,
+        "working_width": args.working_width if args.tracking else None,
+    }
+    stt_backend = None if args.no_audio else args.stt_backend
+    stt_options = {
+        "whisper": {"model_size": args.whisper_model},
+        "vosk": {"model_path": args.vosk_model_path},
+    }.get(stt_backend, {})
+    params = {"fps": args.fps, "chunk_seconds": args.chunk_seconds, "detector": detector_params, "stt_backend": stt_backend}
+
+    jobs = []
+    for path, relative in find_recordings(args.inputs):
+        output_path = os.path.join(args.output, os.path.splitext(relative)[0] + ".json")
+        if args.overwrite or not os.path.exists(output_path):
+            jobs.append((path, output_path))
+    print(f"{len(jobs)} recording(s) to analyse with {args.workers} worker(s)")
+
+    totals, failed = Counter(), 0
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(detector_params, stt_backend, stt_options),
+    ) as executor:
+        futures = {
+            executor.submit(analyze_recording, path, output_path, args.fps, args.chunk_seconds, params): path
+            for path, output_path in jobs
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(jobs)}] {path}: failed: {e}")
+                continue
+            totals.update(summary["warning_counts"])
+            warnings = ", ".join(f"{name}: {count}" for name, count in summary["warning_counts"].items()) or "no warnings"
+            errors = f" (errors: {'; '.join(summary['errors'])})" if summary["errors"] else ""
+            print(f"[{done}/{len(jobs)}] {path}: {summary['frames_analyzed']} frames, "
+                  f"{summary['transcript_segments']} transcript segments, {warnings}{errors}")
+
+    print(f"\nDone: {len(jobs) - failed} analysed, {failed} failed")
+    for name, count in totals.most_common():
+        print(f"  {name}: {count}")
+
+
+if __name__ == "__main__":
+    main()
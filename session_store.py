@@ -0,0 +1,140 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import redis.asyncio as redis
+
+from history_store import UNAVAILABLE
+
+logger = logging.getLogger(__name__)
+
+# Values are "<version>:<json>". Sets KEYS[1] to ARGV[2] (expiring after ARGV[3]
+# seconds) if its version is still ARGV[1]; otherwise returns the current value
+# ("" if there is none) so the caller can retry without reading it again.
+# Values without a version prefix count as version 0.
+COMPARE_AND_SET = """
+local current = redis.call('GET', KEYS[1])
+local version = current and tonumber(string.match(current, '^(%d+):')) or 0
+if version ~= tonumber(ARGV[1]) then
+    return current or ''
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return false
+"""
+
+
+class StateConflict(Exception):
+    """Raised when a session's state kept changing under an update, retries included."""
+
+
+class SessionStateStore:
+    """
+    Per-session proctoring state kept in Redis, with a small LRU cache in front.
+
+    State lives under session:<id>:<namespace> with a TTL, so any worker or node
+    can serve any session and abandoned sessions expire on their own. The local
+    cache holds at most cache_size entries, each trusted for cache_ttl seconds,
+    which absorbs bursts (e.g. a stream of keyboard batches) without letting a
+    worker act on another worker's state for long.
+
+    Every state carries a version. update() writes with a compare-and-set on
+    it, so when two workers change a session at once the later one re-reads the
+    state from Redis and applies its change again instead of overwriting the
+    other's. While Redis is unreachable the cached state is used regardless of
+    age and updates only change the cache; the next successful update writes
+    the whole state back, unless another worker changed it in the meantime.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        namespace: str,
+        ttl: int = 7200,
+        cache_size: int = 1024,
+        cache_ttl: float = 2.0,
+        retries: int = 5,
+    ):
+        self.client = client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.retries = retries
+        # session -> (trusted until, version, state)
+        self.cache: "OrderedDict[str, Tuple[float, int, Optional[Dict[str, Any]]]]" = OrderedDict()
+        self._compare_and_set = None
+
+    def key(self, session_id: str) -> str:
+        return f"session:{session_id}:{self.namespace}"
+
+    async def update(self, session_id: str, change: Callable[[Optional[Dict[str, Any]]], Awaitable[Tuple[Dict[str, Any], Any]]]) -> Any:
+        """
+        Apply change(state) -> (new state, result) to the session's state and return result.
+
+        change may run more than once: whenever another worker saved the state
+        first, it is called again with the state that worker saved. Raises
+        StateConflict if that still happens after `retries` attempts.
+        """
+        version, state = await self._load(session_id)
+        for _ in range(self.retries + 1):
+            new_state, result = await change(state)
+            value = f"{version + 1}:{json.dumps(new_state)}"
+            try:
+                current = await self.compare_and_set()(keys=[self.key(session_id)], args=[version, value, self.ttl])
+            except UNAVAILABLE as e:
+                logger.warning("Redis unavailable, keeping %s state of session %s locally: %s", self.namespace, session_id, e)
+                # Trusted until the next update manages to write it back
+                self._cache(session_id, version, new_state, ttl=float("inf"))
+                return result
+            if current is None:
+                self._cache(session_id, version + 1, new_state)
+                return result
+            version, state = self._parse(current)
+            self._cache(session_id, version, state)
+        raise StateConflict(f"{self.namespace} state of session {session_id} kept changing during the update")
+
+    def compare_and_set(self):
+        """The COMPARE_AND_SET script, bound to the current client (which may be replaced, e.g. in tests)."""
+        if self._compare_and_set is None or self._compare_and_set.registered_client is not self.client:
+            self._compare_and_set = self.client.register_script(COMPARE_AND_SET)
+        return self._compare_and_set
+
+    def forget(self, session_id: str):
+        """Drop the locally cached state (e.g. after the key was deleted with other session keys)."""
+        self.cache.pop(session_id, None)
+
+    async def _load(self, session_id: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """Return (version, state), from the cache while it is trusted (version 0 and None for no state)."""
+        cached = self.cache.get(session_id)
+        if cached and cached[0] > time.monotonic():
+            self.cache.move_to_end(session_id)
+            return cached[1], cached[2]
+
+        try:
+            raw = await self.client.get(self.key(session_id))
+        except UNAVAILABLE as e:
+            logger.warning("Redis unavailable, using cached %s state of session %s: %s", self.namespace, session_id, e)
+            return (cached[1], cached[2]) if cached else (0, None)
+        version, state = self._parse(raw)
+        self._cache(session_id, version, state)
+        return version, state
+
+    @staticmethod
+    def _parse(raw) -> Tuple[int, Optional[Dict[str, Any]]]:
+        if not raw:
+            return 0, None
+        if isinstance(raw, bytes):
+            raw = raw.decode()
+        version, separator, data = raw.partition(":")
+        if not separator or not version.isdigit():
+            # Saved before states were versioned
+            return 0, json.loads(raw)
+        return int(version), json.loads(data)
+
+    def _cache(self, session_id: str, version: int, state: Optional[Dict[str, Any]], ttl: Optional[float] = None):
+        self.cache[session_id] = (time.monotonic() + (self.cache_ttl if ttl is None else ttl), version, state)
+        self.cache.move_to_end(session_id)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
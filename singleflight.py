@@ -0,0 +1,64 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Lets concurrent callers that need the same value share one computation.
+
+    The first caller for a key runs produce(); callers arriving while it runs
+    wait for its outcome, whatever it is (an exception is raised in all of them
+    rather than retried once per waiter). If the caller running produce() is
+    cancelled, a waiter that wasn't cancelled itself starts over and may run
+    produce() in its place. Used by the LLM response cache and the TTS cache.
+    """
+
+    def __init__(self):
+        self.in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    async def run(
+        self, key: Hashable, produce: Callable[[], Awaitable[T]], cached: Optional[Callable[[], Optional[T]]] = None
+    ) -> Tuple[T, str]:
+        """
+        Return (value, outcome) for key.
+
+        cached() is checked first, and again whenever a waiter starts over, so a
+        value stored by produce() is found there. outcome is "hit" (from cached),
+        "shared" (another caller's computation) or "miss" (computed here).
+        """
+        while True:
+            value = cached() if cached else None
+            if value is not None:
+                return value, "hit"
+            pending = self.in_flight.get(key)
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending), "shared"
+            except asyncio.CancelledError:
+                # The caller computing it was cancelled rather than this one: start over
+                if pending.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            value = await produce()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value, "miss"
+        finally:
+            # A waiter that started over may already have put its own future here
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
@@ -0,0 +1,180 @@
+import io
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import wave
+from typing import Callable, Iterator, Tuple
+
+# These functions block (network, ffmpeg, pyttsx3.runAndWait) and are meant to be
+# run inside the STT/TTS stages from pipeline.py, never directly on the event loop.
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit PCM
+
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY") or shutil.which("ffmpeg") or "ffmpeg"
+
+# The pyttsx3 engine owned by this TTS worker process (see init_tts_worker)
+_engine = None
+_engine_settings = {"rate": 200, "volume": 1.0, "voice": None}
+
+
+def decode_to_pcm(data: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """
+    Decode browser audio (webm/opus, ogg, wav, ...) to raw mono 16-bit PCM.
+
+    ffmpeg reads the upload from stdin and writes PCM to stdout, so nothing
+    touches the filesystem.
+    """
+    process = subprocess.run(
+        [
+            FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+            "-i", "pipe:0",
+            "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ac", "1", "-ar", str(sample_rate),
+            "pipe:1",
+        ],
+        input=data,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=False,
+    )
+    if process.returncode != 0:
+        raise ValueError(f"Could not decode audio: {process.stderr.decode(errors='ignore').strip()}")
+    return process.stdout
+
+
+def read_wav(data: bytes) -> Tuple[int, bytes]:
+    """
+    Return (sample rate, frames) of a mono 16-bit PCM WAV file.
+
+    Raises ValueError for anything else (other formats, stereo, 8/24-bit), which
+    then has to go through decode_to_pcm.
+    """
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            if wav.getnchannels() != 1 or wav.getsampwidth() != SAMPLE_WIDTH or wav.getcomptype() != "NONE":
+                raise ValueError("Not mono 16-bit PCM")
+            return wav.getframerate(), wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError) as e:
+        raise ValueError(f"Not a WAV file: {e}") from e
+
+
+def wav_stream_header(sample_rate: int) -> bytes:
+    """
+    WAV header for mono 16-bit PCM of unknown length, to stream frames after it.
+
+    The RIFF and data sizes are set to the maximum, as is customary for streamed
+    WAV; players read until the connection closes.
+    """
+    byte_rate = sample_rate * SAMPLE_WIDTH
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, byte_rate, SAMPLE_WIDTH, SAMPLE_WIDTH * 8)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+def iter_pcm_chunks(path: str, chunk_seconds: float = 30.0, sample_rate: int = SAMPLE_RATE) -> Iterator[bytes]:
+    """
+    Decode the audio track of a recording on disk and yield it as mono 16-bit PCM.
+
+    ffmpeg streams the decoded audio, so memory use is bounded by one chunk of
+    chunk_seconds no matter how long the recording is. The last chunk may be shorter.
+    """
+    # ffmpeg's errors go to a file: nobody reads a stderr pipe while stdout is
+    # being read, and a damaged recording can log enough to fill it and stall ffmpeg
+    errors = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        [
+            FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin",
+            "-i", path, "-vn",
+            "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ac", "1", "-ar", str(sample_rate),
+            "pipe:1",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=errors,
+    )
+    chunk_size = int(chunk_seconds * sample_rate) * SAMPLE_WIDTH
+    try:
+        while True:
+            chunk = process.stdout.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        if process.wait() != 0:
+            errors.seek(0)
+            raise ValueError(f"Could not decode audio: {errors.read().decode(errors='ignore').strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        errors.close()
+
+
+def _render_in_memory(render: Callable[[str], None]) -> bytes:
+    """
+    Call render(path) and return the bytes it wrote to path.
+
+    pyttsx3 can only save to a filename. On Linux that filename is an anonymous
+    in-memory file (memfd), so rendering works on read-only filesystems; other
+    platforms fall back to a temporary file that is always removed.
+    """
+    if hasattr(os, "memfd_create"):
+        fd = os.memfd_create("tts")
+        try:
+            path = f"/proc/self/fd/{fd}"
+            render(path)
+            with open(path, "rb") as rendered:
+                return rendered.read()
+        finally:
+            os.close(fd)
+
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        render(path)
+        with open(path, "rb") as rendered:
+            return rendered.read()
+    finally:
+        os.remove(path)
+
+
+def init_tts_worker(rate: int = 200, volume: float = 1.0, voice=None):
+    """
+    Process-pool initializer: create this worker's pyttsx3 engine once.
+
+    pyttsx3 is not safe to drive from several threads, so every TTS worker is a
+    separate process with its own engine that is reused for all its requests.
+    """
+    global _engine
+    _engine_settings.update(rate=rate, volume=volume, voice=voice)
+    _engine = None
+    _get_engine()
+
+
+def _get_engine():
+    global _engine
+    if _engine is None:
+        # Imported here so only TTS worker processes load pyttsx3 and its driver
+        import pyttsx3
+        _engine = pyttsx3.init()
+        _engine.setProperty('rate', _engine_settings["rate"])
+        _engine.setProperty('volume', _engine_settings["volume"])
+        if _engine_settings["voice"]:
+            _engine.setProperty('voice', _engine_settings["voice"])
+    return _engine
+
+
+def text_to_speech(text) -> bytes:
+    """Convert AI response to speech and return the rendered audio."""
+    engine = _get_engine()
+
+    def render(audio_path):
+        engine.save_to_file(text, audio_path)
+        engine.runAndWait()
+
+    return _render_in_memory(render)
@@ -0,0 +1,70 @@
+import asyncio
+import re
+from typing import AsyncIterator, Awaitable, Callable, Tuple
+
+# A sentence ends at ., ! or ? followed by whitespace (the next token has started)
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+
+
+async def iter_sentences(tokens: AsyncIterator[str], min_length: int = 12) -> AsyncIterator[str]:
+    """
+    Group a stream of LLM tokens into sentences.
+
+    Very short fragments (e.g. "Ok.") are merged with the following sentence so the
+    TTS engine isn't invoked for a single word.
+    """
+    buffer = ""
+    async for token in tokens:
+        buffer += token
+        while True:
+            match = next((m for m in SENTENCE_END.finditer(buffer) if m.end() >= min_length), None)
+            if not match:
+                break
+            sentence, buffer = buffer[:match.end()].strip(), buffer[match.end():]
+            if sentence:
+                yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
+
+async def synthesize_sentences(
+    sentences: AsyncIterator[str],
+    synthesize: Callable[[str], Awaitable[bytes]],
+    max_pending: int = 2,
+) -> AsyncIterator[Tuple[str, bytes]]:
+    """
+    Synthesize sentences as they arrive and yield (sentence, audio) in order.
+
+    Synthesis of sentence N overlaps with generation of sentence N+1; at most
+    max_pending sentences are synthesized ahead of what the client has consumed.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max_pending)
+
+    async def produce():
+        try:
+            async for sentence in sentences:
+                await slots.acquire()
+                queue.put_nowait((sentence, asyncio.ensure_future(synthesize(sentence))))
+        finally:
+            queue.put_nowait(None)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            sentence, audio = item
+            result = await audio
+            slots.release()
+            yield sentence, result
+        # Surface errors raised while generating tokens
+        await producer
+    finally:
+        if not producer.done():
+            producer.cancel()
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not None:
+                item[1].cancel()
@@ -0,0 +1,118 @@
+import json
+from typing import Optional
+
+
+class TranscriptionError(Exception):
+    """Raised when a speech recognition backend fails (as opposed to hearing nothing)."""
+
+
+class SpeechRecognizer:
+    """
+    Base class for speech-to-text backends.
+
+    Backends receive raw mono 16-bit PCM and return the transcript, or an empty
+    string if no speech could be recognised. load() is called once at startup so
+    local models are resident before the first candidate speaks. transcribe() is
+    called from several threads at once (the STT stage), one utterance each.
+    """
+
+    name = "base"
+
+    def load(self):
+        pass
+
+    def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        raise NotImplementedError
+
+
+class GoogleRecognizer(SpeechRecognizer):
+    """Google Web Speech API through speech_recognition (needs network access)."""
+
+    name = "google"
+
+    def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        import speech_recognition as sr
+
+        recognizer = sr.Recognizer()
+        audio_data = sr.AudioData(pcm, sample_rate, 2)
+        try:
+            return recognizer.recognize_google(audio_data)
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError as e:
+            raise TranscriptionError(str(e)) from e
+
+
+class WhisperRecognizer(SpeechRecognizer):
+    """
+    Local Whisper model via faster-whisper, loaded once and shared by all requests.
+
+    CTranslate2 runs at most num_workers transcriptions of one model at a time,
+    so it should match the number of threads calling transcribe().
+    """
+
+    name = "whisper"
+
+    def __init__(
+        self, model_size: str = "base.en", compute_type: str = "int8", language: Optional[str] = "en", num_workers: int = 1
+    ):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.language = language
+        self.num_workers = num_workers
+        self.model = None
+
+    def load(self):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(
+            self.model_size, device="cpu", compute_type=self.compute_type, num_workers=self.num_workers
+        )
+
+    def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        if self.model is None:
+            self.load()
+        import numpy as np
+
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        try:
+            segments, _ = self.model.transcribe(audio, language=self.language, beam_size=1, vad_filter=True)
+            return " ".join(segment.text.strip() for segment in segments).strip()
+        except Exception as e:
+            raise TranscriptionError(str(e)) from e
+
+
+class VoskRecognizer(SpeechRecognizer):
+    """Local Kaldi model via vosk; the model is shared, recognizers are per utterance."""
+
+    name = "vosk"
+
+    def __init__(self, model_path: str = "model"):
+        self.model_path = model_path
+        self.model = None
+
+    def load(self):
+        from vosk import Model
+
+        self.model = Model(self.model_path)
+
+    def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        from vosk import KaldiRecognizer
+
+        if self.model is None:
+            self.load()
+        recognizer = KaldiRecognizer(self.model, sample_rate)
+        recognizer.AcceptWaveform(pcm)
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+
+def create_recognizer(backend: str, **options) -> SpeechRecognizer:
+    """Create the STT backend selected in configuration."""
+    backends = {
+        GoogleRecognizer.name: GoogleRecognizer,
+        WhisperRecognizer.name: WhisperRecognizer,
+        VoskRecognizer.name: VoskRecognizer,
+    }
+    if backend not in backends:
+        raise ValueError(f"Unknown STT backend '{backend}', expected one of {sorted(backends)}")
+    return backends[backend](**options)
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionGate, Busy, RateLimiter, TurnDeduplicator
+
+
+def producer(calls, chunks=(("Hello.", b"audio"),), delay=0.02, error=None):
+    """A produce() callable for TurnDeduplicator.run that records how often it ran."""
+    def produce():
+        calls.append(1)
+
+        async def generate():
+            for chunk in chunks:
+                await asyncio.sleep(delay)
+                yield chunk
+            if error is not None:
+                raise error
+        return generate()
+    return produce
+
+
+def test_repeated_key_shares_the_turn():
+    async def scenario():
+        turns, calls = TurnDeduplicator(window=10), []
+        key = turns.fingerprint(False, False, b"answer")
+        first, duplicate_first = turns.run("s1", key, producer(calls))
+        second, duplicate_second = turns.run("s1", key, producer(calls))
+        chunks = [chunk async for chunk in second.replay()]
+        # Same key from another session is a different turn
+        _, other_session = turns.run("s2", key, producer(calls))
+        await asyncio.gather(*turns.running)
+        return first, second, duplicate_first, duplicate_second, other_session, chunks, calls
+
+    first, second, duplicate_first, duplicate_second, other_session, chunks, calls = asyncio.run(scenario())
+    assert second is first
+    assert (duplicate_first, duplicate_second, other_session) == (False, True, False)
+    assert chunks == [("Hello.", b"audio")]
+    assert len(calls) == 2
+
+
+def test_turns_without_a_key_are_never_shared():
+    async def scenario():
+        turns, calls = TurnDeduplicator(window=10), []
+        first, _ = turns.run("s1", None, producer(calls))
+        await first.task
+        second, duplicate = turns.run("s1", None, producer(calls))
+        await second.task
+        return first, second, duplicate, calls
+
+    first, second, duplicate, calls = asyncio.run(scenario())
+    assert second is not first
+    assert not duplicate
+    assert len(calls) == 2
+
+
+def test_different_keys_and_expired_or_failed_turns_run_again():
+    async def scenario():
+        turns, calls = TurnDeduplicator(window=0.05), []
+        a, b = turns.fingerprint(True, True, "turn-a"), turns.fingerprint(True, True, "turn-b")
+        first, _ = turns.run("s1", a, producer(calls))
+        await first.task
+        _, other_key = turns.run("s1", b, producer(calls))
+        await asyncio.gather(*turns.running)
+        await asyncio.sleep(0.1)
+        _, expired = turns.run("s1", b, producer(calls))
+
+        failed, _ = turns.run("s2", a, producer(calls, error=RuntimeError("boom")))
+        await failed.task
+        with pytest.raises(RuntimeError):
+            [chunk async for chunk in failed.replay()]
+        _, retried = turns.run("s2", a, producer(calls))
+        await asyncio.gather(*turns.running)
+        return other_key, expired, retried, calls
+
+    other_key, expired, retried, calls = asyncio.run(scenario())
+    assert (other_key, expired, retried) == (False, False, False)
+    assert len(calls) == 5
+
+
+def test_gate_queues_up_to_max_queue_then_refuses():
+    async def scenario():
+        gate = AdmissionGate("llm", concurrency=1, max_queue=1, queue_timeout=1)
+        release = asyncio.Event()
+        order = []
+
+        async def hold(name):
+            async with gate.admit():
+                order.append(name)
+                await release.wait()
+
+        holder = asyncio.create_task(hold("first"))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(hold("queued"))
+        await asyncio.sleep(0.01)
+        state = (gate.running, gate.waiting)
+        with pytest.raises(Busy):
+            async with gate.admit():
+                pass
+        with pytest.raises(Busy):
+            async with gate.admit(wait=False):
+                pass
+        release.set()
+        await asyncio.gather(holder, queued)
+        return state, order, (gate.running, gate.waiting)
+
+    state, order, after = asyncio.run(scenario())
+    assert state == (1, 1)
+    assert order == ["first", "queued"]
+    assert after == (0, 0)
+
+
+def test_gate_wait_times_out_with_busy():
+    async def scenario():
+        gate = AdmissionGate("tts", concurrency=1, max_queue=4, queue_timeout=0.05)
+        async with gate.admit():
+            with pytest.raises(Busy):
+                async with gate.admit():
+                    pass
+            waiting = gate.waiting
+        # The slot is free again afterwards
+        async with gate.admit(wait=False):
+            pass
+        return waiting
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_rate_limiter_allows_bursts_then_asks_to_wait():
+    limiter = RateLimiter(rate=10, burst=2)
+    assert limiter.acquire("s1") == 0
+    assert limiter.acquire("s1") == 0
+    assert 0 < limiter.acquire("s1") <= 0.1
+    assert limiter.acquire("s2") == 0
@@ -0,0 +1,81 @@
+import numpy as np
+
+from face_detector import FaceDetector, FaceTrackingState
+
+FRAME = np.zeros((100, 100, 3), dtype=np.uint8)
+
+
+def detector(faces, **kwargs):
+    """A FaceDetector that 'detects' the scripted (x, y, w, h) boxes, one list per frame, in a 100x100 frame."""
+    detector = FaceDetector(**kwargs)
+    frames = iter(faces)
+    detector._detect_faces = lambda gray, state: np.asarray(next(frames), dtype=int).reshape(-1, 4)
+    detector._eyes_missing = lambda gray, face: False
+    return detector
+
+
+def test_tilt_early_in_a_recording_is_reported():
+    faces = [[(30, 30, 20, 20)], [(30, 30, 20, 20)], [(50, 30, 20, 20)]]
+    face_detector, state = detector(faces), FaceTrackingState()
+    results = [face_detector.process_frame(FRAME, state, timestamp=t) for t in (0.0, 0.5, 1.0)]
+    assert results[-1]["warnings"] == ["Head tilt detected (left)"]
+    assert state.last_warning_time == 1.0
+
+
+def run(face_detector, frames, state=None):
+    state = state or FaceTrackingState()
+    return [face_detector.process_frame(FRAME, state, timestamp=10.0 * i) for i in range(frames)], state
+
+
+def tilts(results):
+    return [result["tilt_direction"] for result in results]
+
+
+def test_swapped_detection_order_keeps_faces_on_their_tracks():
+    a, b = (10, 30, 20, 20), (60, 30, 20, 20)
+    faces = [[a, b] if i % 2 == 0 else [b, a] for i in range(8)]
+    results, state = run(detector(faces), len(faces))
+    assert tilts(results) == [None] * 8
+    assert not any(result["movement_detected"] for result in results)
+    # Each slot still follows the face it started with
+    assert state.boxes[0].tolist() == [0.1, 0.3, 0.2, 0.2]
+    assert state.boxes[1].tolist() == [0.6, 0.3, 0.2, 0.2]
+
+
+def test_face_lost_briefly_is_reacquired_on_its_track():
+    face = (30, 30, 20, 20)
+    faces = [[face]] * 4 + [[]] * 2 + [[face]] * 2
+    results, state = run(detector(faces), len(faces))
+    assert tilts(results) == [None] * 8
+    assert state.samples[0] == 6
+    assert state.samples[1] == 0
+
+
+def test_face_lost_for_longer_starts_a_new_track():
+    faces = [[(30, 30, 20, 20)]] * 4 + [[]] * 3 + [[(60, 30, 20, 20)]] * 2
+    results, state = run(detector(faces), len(faces))
+    # Reappearing elsewhere isn't a tilt: the old track is gone
+    assert tilts(results) == [None] * 9
+    assert state.samples.tolist() == [2, 0, 0, 0]
+    assert state.boxes[0].tolist() == [0.6, 0.3, 0.2, 0.2]
+
+
+def test_smoothing_delays_a_held_turn_by_one_frame():
+    still, turned = [(30, 30, 20, 20)], [(42, 30, 20, 20)]
+    faces = [still] * 4 + [turned] * 2
+    results, _ = run(detector(faces, smoothing_window=2), len(faces))
+    assert tilts(results) == [None] * 5 + ["left"]
+
+
+def test_smoothing_ignores_a_single_frame_glance():
+    still, turned = [(30, 30, 20, 20)], [(42, 30, 20, 20)]
+    faces = [still] * 4 + [turned] + [still] * 2
+    results, _ = run(detector(faces, smoothing_window=2), len(faces))
+    assert tilts(results) == [None] * 7
+
+
+def test_without_smoothing_a_turn_is_reported_on_its_first_frame():
+    still, turned = [(30, 30, 20, 20)], [(42, 30, 20, 20)]
+    faces = [still] * 4 + [turned] * 2
+    results, _ = run(detector(faces, smoothing_window=1), len(faces))
+    assert tilts(results) == [None] * 4 + ["left", None]
@@ -0,0 +1,134 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from conversation_context import ConversationContext
+from history_store import ChatHistoryStore
+
+SYSTEM = {"role": "system", "content": "You are interviewing the user."}
+
+
+def turn(i):
+    return {"role": "user", "content": f"u{i}"}, {"role": "assistant", "content": f"a{i}"}
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def store(server, **kwargs):
+    return ChatHistoryStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True), **kwargs)
+
+
+def test_session_created_during_outage_is_replayed_in_full(server):
+    async def scenario():
+        history = store(server, local_window=64)
+        server.connected = False
+        await history.create("s1", [SYSTEM])
+        for i in range(40):
+            await history.append("s1", *turn(i))
+
+        # The prompt can still be built from the mirror, starting with the system prompt
+        first, tail, length, _ = await history.load_window("s1", 8)
+        assert first == SYSTEM
+        assert length == 81
+        assert tail[-1] == {"role": "assistant", "content": "a39"}
+
+        server.connected = True
+        messages = await history.load("s1")
+        assert len(messages) == 81
+        assert messages[0] == SYSTEM
+        assert messages[1:3] == list(turn(0))
+        assert messages[-1] == {"role": "assistant", "content": "a39"}
+
+    asyncio.run(scenario())
+
+
+def test_turns_buffered_during_outage_are_appended_after_it(server):
+    async def scenario():
+        history = store(server, local_window=4)
+        await history.create("s1", [SYSTEM])
+        await history.append("s1", *turn(0))
+        await history.load_window("s1", 4)
+
+        server.connected = False
+        for i in range(1, 10):
+            await history.append("s1", *turn(i))
+        await history.set_summary("s1", "summary", 3)
+        await history.append_metrics("s1", {"turn": 10})
+
+        server.connected = True
+        messages = await history.load("s1")
+        assert len(messages) == 21
+        assert messages[0] == SYSTEM
+        assert [m["content"] for m in messages[1:]] == [c for i in range(10) for c in (f"u{i}", f"a{i}")]
+        assert (await history.summary_state("s1"))[1] == {"text": "summary", "covered": "3"}
+        assert await history.load_metrics("s1") == [{"turn": 10}]
+
+    asyncio.run(scenario())
+
+
+def test_sessions_with_unsynced_writes_are_evicted_last(server):
+    async def scenario():
+        history = store(server, local_sessions=2)
+        await history.create("synced", [SYSTEM])
+        server.connected = False
+        await history.create("offline", [SYSTEM])
+        await history.create("newer", [SYSTEM])
+        assert "offline" in history.local
+        assert "synced" not in history.local
+
+        server.connected = True
+        assert await history.load("offline") == [SYSTEM]
+
+    asyncio.run(scenario())
+
+
+def test_clear_deletes_history_and_extra_keys_in_one_call(server):
+    async def scenario():
+        history = store(server)
+        await history.create("s1", [SYSTEM])
+        await history.append_metrics("s1", {"turn": 1})
+        await history.client.set("session:s1:keyboard", "{}")
+        await history.clear("s1", "session:s1:keyboard")
+        assert await history.client.keys("session:s1:*") == []
+        assert "s1" not in history.local
+
+    asyncio.run(scenario())
+
+
+def test_expired_history_is_restarted_from_the_seed(server):
+    async def scenario():
+        history = store(server)
+        context = ConversationContext(history, llm=None)
+        await history.create("s1", [SYSTEM])
+        await history.append("s1", *turn(0), seed=[SYSTEM])
+        await history.load_window("s1", 8)
+        # The session sits idle until its keys expire
+        await history.client.delete(*history._keys("s1"))
+
+        await history.append("s1", *turn(1), seed=[SYSTEM])
+        assert await history.load("s1") == [SYSTEM, *turn(1)]
+        prompt = await context.build("s1", SYSTEM, [{"role": "user", "content": "u2"}])
+        assert prompt["messages"] == [SYSTEM, *turn(1), {"role": "user", "content": "u2"}]
+
+        # The seed is only written to a missing history, also when replayed after an outage
+        server.connected = False
+        await history.append("s1", *turn(2), seed=[SYSTEM])
+        server.connected = True
+        assert await history.load("s1") == [SYSTEM, *turn(1), *turn(2)]
+
+    asyncio.run(scenario())
+
+
+def test_prompt_without_a_system_message_gets_the_default_one(server):
+    async def scenario():
+        history = store(server)
+        context = ConversationContext(history, llm=None)
+        await history.append("s1", *turn(0))
+        prompt = await context.build("s1", SYSTEM, [])
+        assert prompt["messages"] == [SYSTEM, *turn(0)]
+
+    asyncio.run(scenario())
@@ -0,0 +1,31 @@
+import time
+
+from keyboard_tracker import KeyboardTracker
+
+
+def keydown(key, seconds):
+    return {"event_type": "keydown", "key": key, "timestamp": seconds * 1000}
+
+
+def test_cooldown_follows_event_timestamps_within_a_batch():
+    tracker, now = KeyboardTracker(), time.time()
+    warnings = [tracker.track(keydown("F12", now - 10 + offset), received=now) for offset in (0, 1, 3)]
+    assert [bool(w) for w in warnings] == [True, False, True]
+
+
+def test_future_timestamp_does_not_silence_later_warnings():
+    tracker, now = KeyboardTracker(), time.time()
+    assert tracker.track(keydown("F12", now + 10 ** 9), received=now)
+    assert tracker.last_warning_time == now
+    # Saved and restored like between requests
+    tracker = KeyboardTracker.from_state(tracker.to_state())
+    assert tracker.track(keydown("F11", now + 3), received=now + 3)
+
+
+def test_timestamps_older_than_max_event_age_are_clamped():
+    # A client clock an hour behind still gets a warning per cooldown of receive time
+    tracker, now = KeyboardTracker(), time.time()
+    assert tracker.track(keydown("F12", now - 3600), received=now)
+    assert tracker.last_warning_time == now - tracker.max_event_age
+    assert not tracker.track(keydown("F11", now - 3599), received=now + 1)
+    assert tracker.track(keydown("F11", now - 3598), received=now + 3)
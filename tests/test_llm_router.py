@@ -0,0 +1,162 @@
+import asyncio
+
+import httpx
+import pytest
+
+from llm_client import OllamaClient
+from llm_router import OllamaRouter, ResponseCache
+
+MESSAGES = [{"role": "system", "content": "You are interviewing the user."}]
+
+
+def reply(text="What is JSX?"):
+    return {"message": {"role": "assistant", "content": text}, "done": True, "eval_count": 5}
+
+
+def backend(name, respond, calls):
+    """An OllamaClient whose requests go to respond(request) instead of the network."""
+    async def handle(request):
+        calls.append(name)
+        return await respond(request)
+
+    client = OllamaClient(base_url=f"http://{name}")
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handle), base_url=f"http://{name}")
+    return client
+
+
+def router(*responders, cache=True):
+    calls = []
+    clients = [backend(name, respond, calls) for name, respond in zip("abc", responders)]
+    return OllamaRouter(clients, names=list("abc"[:len(clients)]), cache=ResponseCache() if cache else None), calls
+
+
+def slow(response, delay=0.05):
+    async def respond(request):
+        await asyncio.sleep(delay)
+        if isinstance(response, Exception):
+            raise response
+        return response
+    return respond
+
+
+def ok(text="What is JSX?"):
+    return slow(httpx.Response(200, json=reply(text)), 0)
+
+
+def test_concurrent_misses_share_one_generation():
+    async def scenario():
+        llm, calls = router(slow(httpx.Response(200, json=reply())))
+        responses = await asyncio.gather(*(llm.chat(MESSAGES, cacheable=True) for _ in range(5)))
+        assert calls == ["a"]
+        assert {response.json()["message"]["content"] for response in responses} == {"What is JSX?"}
+        assert llm.cache.flights.in_flight == {}
+
+        # Later requests are served from the cache
+        cached = await llm.chat(MESSAGES, cacheable=True)
+        assert cached.json()["cached"] is True
+        assert calls == ["a"]
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_misses_share_an_error_response():
+    async def scenario():
+        llm, calls = router(slow(httpx.Response(500, json={"error": "model failed to load"})))
+        llm.retries = 0
+        responses = await asyncio.gather(*(llm.chat(MESSAGES, cacheable=True) for _ in range(3)), return_exceptions=True)
+        assert [response.status_code for response in responses] == [500, 500, 500]
+        assert calls == ["a"]
+        assert llm.cache.flights.in_flight == {}
+        assert llm.cache.entries == {}
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_misses_share_an_exception():
+    async def scenario():
+        llm, calls = router(slow(httpx.ConnectError("refused")))
+        results = await asyncio.gather(*(llm.chat(MESSAGES, cacheable=True) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, httpx.ConnectError) for result in results)
+        assert calls == ["a"]
+        assert llm.cache.flights.in_flight == {}
+
+    asyncio.run(scenario())
+
+
+def test_waiter_generates_when_the_owner_is_cancelled():
+    async def scenario():
+        llm, calls = router(slow(httpx.Response(200, json=reply()), 0.1))
+        owner = asyncio.create_task(llm.chat(MESSAGES, cacheable=True))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(llm.chat(MESSAGES, cacheable=True))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        response = await waiter
+        assert response.status_code == 200
+        assert calls == ["a", "a"]
+        assert llm.cache.flights.in_flight == {}
+
+    asyncio.run(scenario())
+
+
+def test_fails_over_to_the_next_backend_and_skips_the_failed_one():
+    async def scenario():
+        llm, calls = router(slow(httpx.ConnectError("refused"), 0), ok("from b"))
+        response = await llm.chat(MESSAGES, session_id="s1")
+        assert response.json()["message"]["content"] == "from b"
+        assert calls == ["a", "b"]
+        assert not llm.backends[0].healthy
+        # The session now sticks to the backend that answered
+        await llm.chat(MESSAGES, session_id="s1")
+        assert calls == ["a", "b", "b"]
+
+    asyncio.run(scenario())
+
+
+def test_returns_the_last_error_response_when_every_backend_fails():
+    async def scenario():
+        llm, calls = router(slow(httpx.Response(503), 0), slow(httpx.Response(502), 0))
+        response = await llm.chat(MESSAGES)
+        assert response.status_code == 502
+        assert calls == ["a", "b"]
+
+    asyncio.run(scenario())
+
+
+def test_raises_when_no_backend_can_be_reached():
+    async def scenario():
+        llm, _ = router(slow(httpx.ConnectError("a"), 0), slow(httpx.ConnectError("b"), 0))
+        with pytest.raises(httpx.ConnectError):
+            await llm.chat(MESSAGES)
+
+    asyncio.run(scenario())
+
+
+def test_stream_fails_over_before_the_first_token():
+    async def scenario():
+        async def stream(request):
+            lines = [
+                '{"message": {"content": "Hello "}, "done": false}',
+                '{"message": {"content": "Sid."}, "done": true, "eval_count": 2}',
+            ]
+            return httpx.Response(200, content="\n".join(lines).encode())
+
+        llm, calls = router(slow(httpx.ConnectError("refused"), 0), stream)
+        stats = {}
+        tokens = [token async for token in llm.stream_chat(MESSAGES, stats, session_id="s1")]
+        assert tokens == ["Hello ", "Sid."]
+        assert stats["eval_count"] == 2
+        assert calls == ["a", "b"]
+
+    asyncio.run(scenario())
+
+
+def test_sessions_stick_to_a_backend_and_spread_across_backends():
+    async def scenario():
+        llm, calls = router(ok(), ok())
+        for session_id in ("s1", "s2", "s1", "s2", "s1"):
+            await llm.chat(MESSAGES, session_id=session_id)
+        assert llm.sessions["s1"] is not llm.sessions["s2"]
+        assert calls.count(llm.sessions["s1"].name) == 3
+
+    asyncio.run(scenario())
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+from session_store import SessionStateStore, StateConflict
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def store(server, **kwargs):
+    """A store as one worker sees it; stores on the same server share Redis but not their caches."""
+    return SessionStateStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True), "keyboard", **kwargs)
+
+
+def saved(server, session_id="s1"):
+    """The state as stored in Redis."""
+    async def read():
+        client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        return SessionStateStore._parse(await client.get(f"session:{session_id}:keyboard"))[1]
+    return read()
+
+
+def add(item):
+    async def change(state):
+        items = (state or {}).get("items", [])
+        return {"items": items + [item]}, len(items) + 1
+    return change
+
+
+def test_concurrent_workers_do_not_overwrite_each_other(server):
+    async def scenario():
+        first, second = store(server), store(server)
+        await first.update("s1", add("a"))
+        # Both workers now trust their cached copy of the state
+        await second._load("s1")
+        await first.update("s1", add("b"))
+        # second's cached version is stale: its change is re-applied to first's state
+        count = await second.update("s1", add("c"))
+        return count, await saved(server), (await second._load("s1"))[1]
+
+    count, stored, cached = asyncio.run(scenario())
+    assert count == 3
+    assert stored == cached == {"items": ["a", "b", "c"]}
+
+
+def test_interleaved_updates_all_land(server):
+    async def scenario():
+        workers = [store(server) for _ in range(4)]
+
+        async def slow_add(worker, item):
+            async def change(state):
+                await asyncio.sleep(0.01)
+                return await add(item)(state)
+            await worker.update("s1", change)
+
+        await asyncio.gather(*(slow_add(worker, i) for i, worker in enumerate(workers)))
+        return await saved(server)
+
+    assert sorted(asyncio.run(scenario())["items"]) == [0, 1, 2, 3]
+
+
+def test_unversioned_state_is_read_and_upgraded(server):
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        await client.set("session:s1:keyboard", json.dumps({"items": ["old"]}))
+        await store(server).update("s1", add("new"))
+        return await client.get("session:s1:keyboard")
+
+    assert asyncio.run(scenario()) == '1:{"items": ["old", "new"]}'
+
+
+def test_update_during_outage_is_written_back_after_it(server):
+    async def scenario():
+        worker = store(server, cache_ttl=0)
+        await worker.update("s1", add("a"))
+        server.connected = False
+        await worker.update("s1", add("b"))
+        assert (await worker._load("s1"))[1] == {"items": ["a", "b"]}
+        server.connected = True
+        await worker.update("s1", add("c"))
+        return await saved(server)
+
+    assert asyncio.run(scenario()) == {"items": ["a", "b", "c"]}
+
+
+def test_update_gives_up_when_the_state_keeps_changing(server):
+    async def scenario():
+        worker, other = store(server, retries=2), store(server, cache_ttl=0)
+        calls = []
+
+        async def change(state):
+            calls.append(state)
+            await other.update("s1", add("other"))
+            return await add("mine")(state)
+
+        with pytest.raises(StateConflict):
+            await worker.update("s1", change)
+        return calls
+
+    assert len(asyncio.run(scenario())) == 3
+
+
+def test_updates_follow_a_replaced_client(server):
+    async def scenario():
+        worker = store(fakeredis.FakeServer())
+        await worker.update("s1", add("a"))
+        # e.g. the load test pointing the app's stores at its own Redis
+        worker.client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        worker.forget("s1")
+        await worker.update("s1", add("b"))
+        return await saved(server)
+
+    assert asyncio.run(scenario()) == {"items": ["b"]}
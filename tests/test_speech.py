@@ -0,0 +1,47 @@
+import io
+import wave
+
+import pytest
+
+import speech
+
+
+def wav(frames, rate=22050, channels=1, width=2):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(channels)
+        out.setsampwidth(width)
+        out.setframerate(rate)
+        out.writeframes(frames)
+    return buffer.getvalue()
+
+
+def test_read_wav_returns_rate_and_frames():
+    assert speech.read_wav(wav(b"\x01\x02" * 50)) == (22050, b"\x01\x02" * 50)
+
+
+@pytest.mark.parametrize("data", [b"ID3 not a wav", wav(b"\x01\x02" * 50, channels=2), wav(b"\x01" * 50, width=1)])
+def test_read_wav_rejects_other_audio(data):
+    with pytest.raises(ValueError):
+        speech.read_wav(data)
+
+
+def test_stream_header_plays_frames_of_several_sentences():
+    stream = speech.wav_stream_header(16000) + b"\x01\x02" * 30 + b"\x03\x04" * 20
+    with wave.open(io.BytesIO(stream)) as played:
+        assert (played.getnchannels(), played.getsampwidth(), played.getframerate()) == (1, 2, 16000)
+        assert played.readframes(1000) == b"\x01\x02" * 30 + b"\x03\x04" * 20
+
+
+def test_pcm_chunks_survive_a_flood_of_decoder_errors(tmp_path, monkeypatch):
+    # Stands in for ffmpeg on a damaged recording: far more stderr than a pipe buffers
+    fake = tmp_path / "ffmpeg"
+    fake.write_text("#!/bin/sh\nhead -c 1000000 /dev/zero | tr '\\0' 'e' >&2\nprintf 'abcd'\nexit 1\n")
+    fake.chmod(0o755)
+    monkeypatch.setattr(speech, "FFMPEG_BINARY", str(fake))
+
+    chunks = []
+    with pytest.raises(ValueError, match="Could not decode audio: eee"):
+        for chunk in speech.iter_pcm_chunks("damaged.webm", chunk_seconds=1):
+            chunks.append(chunk)
+    assert chunks == [b"abcd"]
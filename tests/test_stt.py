@@ -0,0 +1,26 @@
+import sys
+import types
+
+import pytest
+
+from stt import WhisperRecognizer, create_recognizer
+
+
+def test_whisper_model_runs_as_many_transcriptions_as_stt_threads(monkeypatch):
+    created = {}
+
+    class WhisperModel:
+        def __init__(self, model_size, **options):
+            created.update(options, model_size=model_size)
+
+    monkeypatch.setitem(sys.modules, "faster_whisper", types.SimpleNamespace(WhisperModel=WhisperModel))
+    recognizer = create_recognizer("whisper", model_size="tiny.en", num_workers=4)
+    recognizer.load()
+    assert isinstance(recognizer, WhisperRecognizer)
+    assert created["model_size"] == "tiny.en"
+    assert created["num_workers"] == 4
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown STT backend"):
+        create_recognizer("nope")
@@ -0,0 +1,42 @@
+import asyncio
+
+from tts_cache import SpeechCache
+
+
+def synthesizer(calls, delay=0.05):
+    async def synthesize(text):
+        calls.append(text)
+        await asyncio.sleep(delay)
+        return text.encode()
+    return synthesize
+
+
+def test_concurrent_misses_share_one_synthesis():
+    async def scenario():
+        cache, calls = SpeechCache(max_bytes=1024), []
+        synthesize = synthesizer(calls)
+        audio = await asyncio.gather(*(cache.get_or_synthesize("Hello.", synthesize) for _ in range(5)))
+        assert audio == [b"Hello."] * 5
+        assert calls == ["Hello."]
+        assert cache.flights.in_flight == {}
+
+        assert await cache.get_or_synthesize("Hello.", synthesize) == b"Hello."
+        assert calls == ["Hello."]
+
+    asyncio.run(scenario())
+
+
+def test_waiter_synthesizes_when_the_owner_is_cancelled():
+    async def scenario():
+        cache, calls = SpeechCache(max_bytes=1024), []
+        synthesize = synthesizer(calls, 0.1)
+        owner = asyncio.create_task(cache.get_or_synthesize("Hello.", synthesize))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_synthesize("Hello.", synthesize))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        assert await waiter == b"Hello."
+        assert calls == ["Hello.", "Hello."]
+        assert cache.flights.in_flight == {}
+
+    asyncio.run(scenario())
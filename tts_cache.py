@@ -0,0 +1,60 @@
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from singleflight import SingleFlight
+
+
+class SpeechCache:
+    """
+    Content-addressed LRU cache of synthesized audio.
+
+    Entries are keyed by a hash of text + voice + rate and bounded by total size.
+    Pinned entries (the fixed fallback/error phrases) are never evicted, and
+    concurrent requests for the same text share one synthesis.
+    """
+
+    def __init__(self, max_bytes: int, voice: Optional[str] = None, rate: int = 200):
+        self.max_bytes = max_bytes
+        self.voice = voice or "default"
+        self.rate = rate
+        self.entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self.pinned: Dict[str, bytes] = {}
+        self.size = 0
+        self.flights = SingleFlight()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.voice}\0{self.rate}\0{text}".encode()).hexdigest()
+
+    def get(self, text: str) -> Optional[bytes]:
+        key = self.key(text)
+        if key in self.pinned:
+            return self.pinned[key]
+        audio = self.entries.get(key)
+        if audio is not None:
+            self.entries.move_to_end(key)
+        return audio
+
+    def put(self, text: str, audio: bytes, pin: bool = False):
+        key = self.key(text)
+        if pin:
+            self.pinned[key] = audio
+            return
+        if key in self.entries or len(audio) > self.max_bytes:
+            return
+        self.entries[key] = audio
+        self.size += len(audio)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    async def get_or_synthesize(self, text: str, synthesize: Callable[[str], Awaitable[bytes]], pin: bool = False) -> bytes:
+        """Return cached audio for text, synthesizing it (once) on a miss."""
+
+        async def render() -> bytes:
+            audio = await synthesize(text)
+            self.put(text, audio, pin=pin)
+            return audio
+
+        audio, _ = await self.flights.run(self.key(text), render, lambda: self.get(text))
+        return audio